@@ -0,0 +1,245 @@
+'''
+:module bench_genie:
+Benchmarks for ClassGenie. Synthesizes a project modeled on xml/config.json
+with N classes, M member variables and K functions per class, then times the
+three phases of a run separately:
+
+load        GenProject.import_config on the synthesized json config
+render      write_class for every class into a genie_output.MemorySink. The
+            first run is reported too as render-cold, it's the only one that
+            loads and compiles the templates.
+write       writing the rendered files through genie_output.OutputSink,
+            once into an empty directory and once more with unchanged files
+
+Results are printed (or written with --output) as json so runs of different
+versions can be compared.
+
+example:
+python benchmarks/bench_genie.py --classes 5000 --members 20 --functions 10
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import os
+import sys
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+benchVersion = 2
+
+def import_args():
+    import argparse
+
+    description = 'Benchmarks for ClassGenie project load, render and write phases'
+
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('--classes', dest='classes', action='store', type=int, default=1000,
+                        help='Number of classes in the synthesized project. Default 1000.')
+    parser.add_argument('--members', dest='members', action='store', type=int, default=10,
+                        help='Member variables per class. Default 10.')
+    parser.add_argument('--functions', dest='functions', action='store', type=int, default=5,
+                        help='Functions per class. Default 5.')
+    parser.add_argument('--repeat', dest='repeat', action='store', type=int, default=3,
+                        help='Times each phase is run. The best time is reported. Default 3.')
+    parser.add_argument('--output', dest='output', action='store', default=None,
+                        help='File to write the json results to. Default stdout.')
+
+    return vars(parser.parse_args())
+
+def synthesize_config(classes, members, functions, templateLocation):
+    '''
+    Builds a project config dictionary shaped like xml/config.json.
+
+    :param classes int: number of classes
+    :param members int: member variables per class
+    :param functions int: functions per class
+    :param templateLocation string: directory holding the template files
+    :return dict: project config
+    '''
+    config = {
+        "project-name":"BenchProject",
+        "default-license":"license.txt",
+        "project-directory":"",
+        "template-location":templateLocation,
+        "default-definition-template":"definition.template",
+        "default-implementation-template":"impl.template",
+        "default-namespace":"bench",
+        "default-grammar-file":"grammar.json",
+        "language":"c++",
+        "classes":{}
+    }
+
+    memberFunction = {"generate":True, "custom-code":[]}
+    for i in range(classes):
+        name = "BenchClass" + str(i)
+        classDict = {
+            "name":name,
+            "definition-template":"",
+            "implementation-template":"",
+            "grammar-file":"grammar.json",
+            "class-license":"",
+            "namespace":"",
+            "subdirectory":"",
+            "base-classes":["BenchClass" + str(i - 1)] if i else [],
+            "system-includes":["string", "vector"],
+            "dependencies":[],
+            "default-constructor":dict(memberFunction),
+            "default-destructor":dict(memberFunction),
+            "copy-constructor":dict(memberFunction),
+            "assignment-operator":dict(memberFunction),
+            "equals-operator":dict(memberFunction),
+            "not-equals-operator":dict(memberFunction),
+            "output-operator":dict(memberFunction),
+            "input-operator":dict(memberFunction),
+            "member-variables":{},
+            "functions":{}
+        }
+
+        for m in range(members):
+            memberName = "member" + str(m)
+            classDict["member-variables"][memberName] = {
+                "name":memberName,
+                "scope":"private",
+                "type":"integer",
+                "access-function":False,
+                "default-value":"0"
+            }
+
+        for f in range(functions):
+            functionName = "function" + str(f)
+            classDict["functions"][functionName] = {
+                "name":functionName,
+                "documentation":True,
+                "scope":"public" if f % 2 else "private",
+                "return-type":"void",
+                "parameters":{
+                    "param1":{"name":"param1", "type":"double", "default-value":"0"}
+                },
+                "custom-code":[]
+            }
+
+        config["classes"][name] = classDict
+
+    return config
+
+def best_time(func, repeat):
+    '''
+    :param func callable: phase to time, called with no arguments
+    :param repeat int: number of runs
+    :return tuple: (best time in seconds, time of the first run, result of
+        the last run)
+    '''
+    import time
+
+    best = None
+    first = None
+    result = None
+    for i in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        first = elapsed if first is None else first
+
+    return best, first, result
+
+def run(classes, members, functions, repeat):
+    '''
+    :return dict: benchmark results
+    '''
+    import json
+    import platform
+    import shutil
+    import tempfile
+    from genie_classes import GenProject
+    from genie_config import json_backend
+    from genie_output import OutputSink, MemorySink
+    from genie_writers import write_class
+
+    workDir = tempfile.mkdtemp(prefix="genie-bench-")
+    try:
+        configFile = os.path.join(workDir, "config.json")
+        config = synthesize_config(classes, members, functions, os.path.join(repoDir, "templates"))
+        config["project-directory"] = workDir
+        with open(configFile, "w") as f:
+            json.dump(config, f)
+
+        loadTime, loadFirst, project = best_time(lambda: GenProject(configFile), repeat)
+
+        def render():
+            sink = MemorySink()
+            shared = {}
+            for gClass in project.gen_class:
+                write_class(project, gClass, sink, shared=shared)
+            return list(sink.files.items())
+
+        renderTime, renderColdTime, rendered = best_time(render, repeat)
+
+        def write():
+            sink = OutputSink()
+            for path, text in rendered:
+                parentDir = os.path.dirname(path)
+                if not os.path.isdir(parentDir):
+                    os.makedirs(parentDir)
+                sink.write(path, text)
+            return sink.counts
+
+        outputDir = os.path.dirname(rendered[0][0]) if rendered else workDir
+
+        def write_new():
+            shutil.rmtree(outputDir, ignore_errors=True)
+            return write()
+
+        writeNewTime, writeNewFirst, counts = best_time(write_new, repeat)
+        writeUnchangedTime, writeUnchangedFirst, counts = best_time(write, repeat)
+
+        results = {
+            "version" : benchVersion,
+            "python" : platform.python_version(),
+            "platform" : platform.platform(),
+            "json-backend" : json_backend(),
+            "parameters" : {
+                "classes" : classes,
+                "members" : members,
+                "functions" : functions,
+                "repeat" : repeat
+            },
+            "config-bytes" : os.path.getsize(configFile),
+            "output-bytes" : sum(len(text.encode("utf-8")) for path, text in rendered),
+            "seconds" : {
+                "load" : loadTime,
+                "render" : renderTime,
+                "render-cold" : renderColdTime,
+                "write-new" : writeNewTime,
+                "write-unchanged" : writeUnchangedTime
+            },
+            "per-class-microseconds" : {
+                "render" : renderTime / max(1, classes) * 1e6,
+                "render-cold" : renderColdTime / max(1, classes) * 1e6,
+                "write-new" : writeNewTime / max(1, classes) * 1e6
+            }
+        }
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    return results
+
+def main():
+    import json
+
+    args = import_args()
+    results = run(args['classes'], args['members'], args['functions'], args['repeat'])
+
+    text = json.dumps(results, indent=4, sort_keys=True)
+    if args['output']:
+        with open(args['output'], "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    return
+
+if __name__ == "__main__":
+    main()
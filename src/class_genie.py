@@ -9,14 +9,79 @@
 
 def import_args():
     import argparse
+    import os
     
     description = 'Command line interface for ClassGenie '
 
     parser = argparse.ArgumentParser(description=description)
 
-    parser.add_argument('--config_file', dest='config', action='store', required='True',
+    parser.add_argument('--config_file', dest='config', action='store',
                         help='Config file that sets necessary class definition'
-                        'parameters. If a configuration item is present in both')
+                        'parameters. If a configuration item is present in both. '
+                        'Can also be a directory of per class json shards.')
+    parser.add_argument('--jobs', dest='jobs', action='store', type=int, default=1,
+                        help='Number of worker processes used to write classes. '
+                        '0 uses one per cpu. Default 1.')
+    parser.add_argument('--force', dest='force', action='store_true',
+                        help='Write every class, even if its inputs are unchanged '
+                        'since the last run.')
+    parser.add_argument('--stream', dest='stream', action='store_true',
+                        help='Render and write files in chunks. Lowers memory use '
+                        'for very large classes.')
+    parser.add_argument('--writers', dest='writers', action='store', type=int, default=0,
+                        help='Number of threads writing files while classes are rendered. '
+                        'Helps most on network filesystems. Default 0, files are '
+                        'written as they are rendered.')
+    parser.add_argument('--fsync', dest='fsync', action='store_true',
+                        help='Flush the generated files to disk once the run is done.')
+    parser.add_argument('--archive', dest='archive', action='store', default=None,
+                        metavar='FILE',
+                        help='Write the generated files into one .tar, .tar.gz, .tgz, '
+                        '.tar.bz2, .tar.xz or .zip file instead of the project directory. '
+                        'Every class is generated.')
+    parser.add_argument('--dry_run', dest='dry_run', action='store_true',
+                        help='Generate every class in memory and list the files that would be '
+                        'new or changed, without writing anything. Always runs locally.')
+    parser.add_argument('--diff', dest='diff', action='store_true',
+                        help='With --dry_run, print unified diffs of the changes instead '
+                        'of file names. Implies --dry_run.')
+    parser.add_argument('--stream_config', dest='stream_config', action='store_true',
+                        help='Parse the config one class at a time and start generating '
+                        'before the whole file is read. Project settings must come '
+                        'before "classes" in the config.')
+    parser.add_argument('--only', dest='only', action='append', default=None,
+                        metavar='CLASS_NAME',
+                        help='Only generate this class. Can be given more than once.')
+    parser.add_argument('--with_dependents', dest='with_dependents', action='store_true',
+                        help='With --only, also generate every class that uses the '
+                        'given classes as a base class or dependency, even if it is '
+                        'unchanged since the last run.')
+    parser.add_argument('--validate', dest='validate', action='store_true',
+                        help='Check every class, member, function and parameter name is a '
+                        'legal C++ identifier before generating. All problems are '
+                        'listed and nothing is generated if there are any.')
+    parser.add_argument('--snapshot', dest='snapshot', action='store', default=None,
+                        help='Binary project snapshot. Loaded instead of the json '
+                        'config when it is up to date, rewritten otherwise.')
+    parser.add_argument('--profile', dest='profile', action='store', nargs='?',
+                        const='genie_profile.json', default=None,
+                        help='Time each class and print a summary table at the end. '
+                        'The full report is written to the given json file, '
+                        'genie_profile.json by default.')
+    parser.add_argument('--watch', dest='watch', action='store_true',
+                        help='Keep running and regenerate the classes affected each time '
+                        'the config, a template, a grammar or a license file changes.')
+    parser.add_argument('--serve', dest='serve', action='store', nargs='?',
+                        const='.classgenie.sock', default=None, metavar='ADDRESS',
+                        help='Run as a resident server that keeps projects and templates '
+                        'loaded. ADDRESS is a Unix socket path or http://127.0.0.1:PORT, '
+                        '.classgenie.sock by default. An http server only answers '
+                        'clients that can read the token it writes to ~/.classgenie-PORT.token.')
+    parser.add_argument('--server', dest='server', action='store',
+                        default=os.environ.get('CLASSGENIE_SERVER'), metavar='ADDRESS',
+                        help='Send the run to a server started with --serve. Generates '
+                        'in process if no server answers. Defaults to the '
+                        'CLASSGENIE_SERVER environment variable.')
     parser.add_argument('--version', action='version',
                         version='ClassGenie 0.1',
                         help='Show the version number and exit.')
@@ -33,49 +98,171 @@ def import_args():
     #return the args as a dictionary
     args = vars(parser.parse_args())
     
+    if not args['config'] and not args['serve']:
+        parser.error('the following arguments are required: --config_file')
+    
+    if args['diff']:
+        args['dry_run'] = True
+    
+    if args['dry_run'] and args['archive']:
+        parser.error('--dry_run and --archive cannot be used together')
+    
+    if args['dry_run'] and args['watch']:
+        parser.error('--dry_run and --watch cannot be used together')
+    
+    #watch mode reloads the config itself and regenerates whatever changed
+    if args['watch']:
+        for option in ('archive', 'only', 'snapshot'):
+            if args[option]:
+                parser.error('--' + option + ' and --watch cannot be used together')
+    
+    if args['with_dependents'] and not args['only']:
+        parser.error('--with_dependents needs at least one --only class')
+    
     return args
 
+def start_remote(args, pathToConfig):
+    '''
+    Hands the run to a server started with --serve.
+    
+    :param args dict: command line arguments
+    :param pathToConfig string: config file or sharded project directory
+    :return boolean: true if a server ran it, false if none answered
+    '''
+    import os
+    import sys
+    from genie_server import send_request
+    
+    request = {
+        "config" : os.path.abspath(pathToConfig),
+        "cwd" : os.getcwd(),
+        "jobs" : args['jobs'],
+        "force" : args['force'],
+        "stream" : args['stream'],
+        "writers" : args['writers'],
+        "fsync" : args['fsync'],
+        "archive" : os.path.abspath(args['archive']) if args['archive'] else None,
+        "stream-config" : args['stream_config'],
+        "only" : args['only'],
+        "with-dependents" : args['with_dependents'],
+        "snapshot" : os.path.abspath(args['snapshot']) if args['snapshot'] else None,
+        "validate" : args['validate'],
+        "profile" : bool(args['profile'])
+    }
+    
+    try:
+        response = send_request(args['server'], request)
+    except OSError as e:
+        print ("No server at " + args['server'] + " (" + str(e) + "), generating locally")
+        return False
+    
+    sys.stdout.write(response["output"])
+    
+    if response["profile"]:
+        from genie_profile import Profiler
+        profiler = Profiler()
+        for record in response["profile"]["classes"]:
+            profiler.finish_class(record)
+        print (profiler.summary())
+        profiler.dump(args['profile'])
+    
+    if response["error"]:
+        sys.exit(response["error"])
+    
+    return True
+
 def start():
     
-    from genie_classes import GenProject, GenClass
-    from genie_writers import write_project as write_
     import os
+    import sys
     
     args = import_args()
     
+    if args['serve']:
+        from genie_server import serve
+        serve(args['serve'])
+        return
+    
     pathToConfig = args['config']
     
-    if (not os.path.isfile(pathToConfig)):
+    if (not os.path.exists(pathToConfig)):
         '''might be a relative path'''
         pathToConfig = os.path.abspath(pathToConfig)
-        if (not os.path.isfile(pathToConfig)):
+        if (not os.path.exists(pathToConfig)):
             print("didn't find path...")
             print("do something...")
 
-    project = GenProject(args['config'])
-    #project.config =
-    #project.import_config()
+    profiler = None
+    if args['profile']:
+        from genie_profile import Profiler
+        profiler = Profiler()
     
-    project.project_directory = "/home/dwebb/workspace/ClassGenie/examples/test"
-    project.project_name = "TestProject"
+    if args['watch']:
+        from genie_watch import watch_project
+        #the profile covers every batch until the watch is stopped
+        try:
+            watch_project(pathToConfig, jobs=args['jobs'], stream=args['stream'],
+                          streamConfig=args['stream_config'], profiler=profiler,
+                          validate=args['validate'], force=args['force'],
+                          writers=args['writers'], fsync=args['fsync'])
+        except ValueError as e:
+            sys.exit(str(e))
+        finally:
+            if profiler:
+                print (profiler.summary())
+                profiler.dump(args['profile'])
+        return
+
+    if args['server'] and not args['dry_run'] and start_remote(args, pathToConfig):
+        return
+
+    from genie_classes import GenProject, GenClass
+    from genie_writers import write_project as write_
+
+    if args['snapshot']:
+        from genie_snapshot import open_project
+        project = open_project(pathToConfig, args['snapshot'])
+    else:
+        project = GenProject(pathToConfig, streamConfig=args['stream_config'])
     
-    print (project.project_name)
+    if args['dry_run']:
+        print (project.project_name, file=sys.stderr)
+    else:
+        print (project.project_name)
     
+    if args['validate']:
+        from genie_validation import validate_project, ValidationError
+        violations = validate_project(project)
+        if violations:
+            sys.exit(str(ValidationError(violations)))
     
-    genClass = GenClass()
-    genClass.name = "TestClass"
-    genClass.subdirectory = "TestClass"
-    genClass.default_constructor = True
-    genClass.default_destructor = True
-    genClass.copy_constructor = False
-    genClass.assignment_operator = False
-    genClass.equals_operator = False
-    genClass.not_equals_operator = False
+    output = None
+    if args['archive']:
+        from genie_output import ArchiveSink
+        output = ArchiveSink(args['archive'], fsync=args['fsync'])
     
-    project.gen_class = genClass
+    #unknown --only classes and dependency cycles are reported as ValueError
+    try:
+        if args['dry_run']:
+            #only the changes go to stdout, progress goes to stderr
+            import contextlib
+            from genie_output import DiffSink
+            output = DiffSink(diff=args['diff'], out=sys.stdout)
+            with contextlib.redirect_stdout(sys.stderr):
+                write_(project, jobs=args['jobs'], stream=args['stream'], profiler=profiler,
+                       classNames=args['only'], withDependents=args['with_dependents'],
+                       output=output)
+        else:
+            write_(project, jobs=args['jobs'], force=args['force'], stream=args['stream'],
+                   profiler=profiler, classNames=args['only'], withDependents=args['with_dependents'],
+                   writers=args['writers'], fsync=args['fsync'], output=output)
+    except ValueError as e:
+        sys.exit(str(e))
     
-    #print (project)
-    write_(project)
+    if profiler:
+        #the table stays out of a dry run's changes on stdout
+        print (profiler.summary(), file=sys.stderr if args['dry_run'] else sys.stdout)
+        profiler.dump(args['profile'])
     
     return
 
@@ -83,7 +270,7 @@ def main():
     try:
         start()
     except KeyboardInterrupt:
-        print_('\nCancelling...')
+        print('\nCancelling...')
 
 if __name__ == "__main__":
     main()
@@ -11,14 +11,141 @@ it to the writers, but these classes should make it a lot cleaner.
 :author: Devin Webb
 :email: devin.a.webb@gmail.com
 '''
+from genie_validation import contains_whitespace, check_identifier, check_name, check_names, ValidationError
+
 indent = "   "
 nl = "\n"
 
-def contains_whitespace(val):
-    import re
-    #contains whitespace?
-    retVal = True if re.search('\s', val) else False
-    return retVal
+class TrackedDict(dict):
+    '''
+    dict that counts its own mutations. The wrapper classes cache their child
+    wrappers (GenProject.gen_class, GenClass.functions, ...) and use the count
+    to tell when the underlying data dictionary changed and the cached
+    wrappers need to be rebuilt.
+    '''
+    __slots__ = ("version",)
+    
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self.version = 0
+        return
+    
+    def __reduce__(self):
+        #rebuild from a plain dict so unpickling doesn't need version set first
+        return (TrackedDict, (dict(self),))
+    
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.version += 1
+        return
+    
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.version += 1
+        return
+    
+    def __ior__(self, other):
+        self.update(other)
+        return self
+    
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.version += 1
+        return
+    
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return dict.setdefault(self, key, default)
+    
+    def pop(self, *args):
+        self.version += 1
+        return dict.pop(self, *args)
+    
+    def popitem(self):
+        self.version += 1
+        return dict.popitem(self)
+    
+    def clear(self):
+        dict.clear(self)
+        self.version += 1
+        return
+
+class WrapperViews:
+    '''
+    Cache of wrapper objects for the values of a dict of data dictionaries.
+    The same wrapper object is returned for a key as long as the key still maps
+    to the same dict, so repeated lookups don't allocate anything.
+
+    The source dict is never replaced, so references to it taken by callers
+    stay live. A TrackedDict is checked by its mutation count, a plain dict,
+    ie one loaded straight from a json config, by its keys and the identity
+    of its values.
+    '''
+    __slots__ = ("wrapper", "source", "version", "views", "byKey")
+    
+    def __init__(self, wrapper):
+        '''
+        :param wrapper class: wrapper class with a data_dictionary attribute
+        '''
+        self.wrapper = wrapper
+        self.source = None
+        self.version = -1
+        self.views = ()
+        self.byKey = {}
+        return
+    
+    def _check_source(self, source):
+        if source is not self.source:
+            self.source = source
+            self.version = -1
+            self.byKey = {}
+        return
+    
+    @staticmethod
+    def _stamp(source):
+        '''
+        :param source dict: dict of data dictionaries
+        :return object: changes whenever source is changed
+        '''
+        if isinstance(source, TrackedDict):
+            return source.version
+        
+        #the cached wrappers hold the values, so their ids can't be reused
+        return tuple((key, id(value)) for key, value in source.items())
+    
+    def get(self, source, key):
+        '''
+        :param source dict: dict of data dictionaries
+        :param key string: key in source
+        :return object: wrapper for source[key]
+        '''
+        self._check_source(source)
+        
+        value = source[key]
+        view = self.byKey.get(key)
+        if view is None or view.data_dictionary is not value:
+            view = self.wrapper()
+            view.data_dictionary = value
+            self.byKey[key] = view
+        
+        return view
+    
+    def all(self, source):
+        '''
+        :param source dict: dict of data dictionaries
+        :return tuple: wrappers for every value in source, in source order
+        '''
+        self._check_source(source)
+        
+        stamp = self._stamp(source)
+        if stamp != self.version:
+            self.views = tuple(self.get(source, key) for key in source)
+            #drops wrappers for keys that were removed
+            self.byKey = dict(zip(source, self.views))
+            self.version = stamp
+        
+        return self.views
 
 class Parameter:
     '''
@@ -32,6 +159,7 @@ class Parameter:
     :param default-value string: string representation of the default value.
         Defaulted to 0, will be converted to type in generated class.
     '''
+    __slots__ = ("data_dictionary",)
     
     @property
     def parameter_name(self):
@@ -41,9 +169,12 @@ class Parameter:
     def parameter_name(self, name):
         '''
         Sets the name key in the data dictionary. Does minimal validation.
+        
+        :raise ValueError: if name isn't a legal C++ identifier
         '''
-        if contains_whitespace(name):
-            raise ValueError('name cannot contain whitespace.')
+        problem = check_identifier(name)
+        if problem:
+            raise ValueError(problem)
         
         self.data_dictionary["name"] = name
         return
@@ -86,6 +217,7 @@ class MemberVariable:
     MemberVariable reperesents a C/C++ member variable, complete with scope,
     type, default value, and a flag for generating setters/getters
     '''
+    __slots__ = ("data_dictionary",)
     
     @property
     def member_name(self):
@@ -98,11 +230,12 @@ class MemberVariable:
         Does some minimal checking for validity
         
         :param name string: name of variable
-        :raise ValueError: if name contains whitespace
+        :raise ValueError: if name isn't a legal C++ identifier
         '''
         
-        if contains_whitespace(name):
-            raise ValueError('name cannot contain whitespace.')
+        problem = check_identifier(name)
+        if problem:
+            raise ValueError(problem)
         
         self.data_dictionary["name"] = name
         return
@@ -168,10 +301,11 @@ class MemberVariable:
 
 
 class MemberFunction:
+    __slots__ = ("data_dictionary",)
     
     @property
     def custom_code(self):
-        return self.data_dictionary("custom-code")
+        return self.data_dictionary["custom-code"]
     
     @custom_code.setter
     def custom_code(self, code):
@@ -188,7 +322,7 @@ class MemberFunction:
         
         :param code list: list of strings to use as custom code in this member function
         '''
-        if not isinstance(code, basestring):
+        if not isinstance(code, str):
             self.data_dictionary["custom-code"] = code
         else:
             raise TypeError("Code must be a list of strings. Each string is 1 line of code.")
@@ -224,6 +358,8 @@ class Function:
     Function represents a C/C++ function, complete with scope, return type,
     a flag to generate default doxygen style documentation, and parameters.
     '''
+    __slots__ = ("data_dictionary",)
+    
     @property
     def function_name(self):
         return self.data_dictionary["name"]
@@ -235,11 +371,12 @@ class Function:
         Does some minimal checking for validity
         
         :param name string: name of variable
-        :raise ValueError: if name contains whitespace
+        :raise ValueError: if name isn't a legal C++ identifier
         '''
         
-        if contains_whitespace(name):
-            raise ValueError('name cannot contain whitespace.')
+        problem = check_identifier(name)
+        if problem:
+            raise ValueError(problem)
         
         self.data_dictionary["name"] = name
         return
@@ -288,7 +425,7 @@ class Function:
         if not isinstance(param, Parameter):
             raise TypeError('param must of type Parameter')
         
-        self.data_dictionary["parameters"][param["name"]] = param
+        self.data_dictionary["parameters"][param.parameter_name] = param.data_dictionary
             
         return
     
@@ -311,6 +448,7 @@ class GenClass:
     '''
     GenClass represents a C/C++ class.
     '''
+    __slots__ = ("data_dictionary", "_memberViews", "_functionViews")
     
     @property
     def name(self):
@@ -323,11 +461,12 @@ class GenClass:
         Does some minimal checking for validity
         
         :param name string: name of class
-        :raise ValueError: if name contains whitespace
+        :raise ValueError: if name isn't a legal C++ identifier
         '''
         
-        if contains_whitespace(newName):
-            raise ValueError('name cannot contain whitespace.')
+        problem = check_identifier(newName)
+        if problem:
+            raise ValueError(problem)
         
         self.data_dictionary["name"] = newName
         return
@@ -360,11 +499,11 @@ class GenClass:
         
     @property
     def class_license(self):
-        return self.data_dictioanry["class-license"]
+        return self.data_dictionary["class-license"]
     
     @class_license.setter
     def class_license(self, license):
-        self.data_dictioanry["class-license"] = license
+        self.data_dictionary["class-license"] = license
         return
     
     @property
@@ -373,7 +512,7 @@ class GenClass:
     
     @namespace.setter
     def namespace(self, newNamespace):
-        self.data_dictioanry["namespace"] = newNamespace
+        self.data_dictionary["namespace"] = newNamespace
         return
     
     @property
@@ -392,7 +531,7 @@ class GenClass:
     @base_classes.setter
     def base_classes(self, baseClass):        
         #if baseClass is already in the data_dictionary, don't put another one
-        if param not in self.data_dictionary["base-classes"]:
+        if baseClass not in self.data_dictionary["base-classes"]:
             self.data_dictionary["base-classes"].append(baseClass)
         return
     
@@ -634,16 +773,13 @@ class GenClass:
     @property
     def member_variables(self):
         '''
-        :return MemberVariable list:
+        :return MemberVariable tuple: cached wrappers, rebuilt only when the
+            member-variables dictionary changes
         '''
-        retVal = []
-        
-        for key, value in self.data_dictionary["member-variables"]:
-            newMember = MemberVariable()
-            newMember.data_dictionary = value
-            retVal.append(newMember)
+        if self._memberViews is None:
+            self._memberViews = WrapperViews(MemberVariable)
         
-        return retVal
+        return self._memberViews.all(self.data_dictionary["member-variables"])
     
     def member_variables_as_dict(self):
         '''
@@ -654,9 +790,9 @@ class GenClass:
     @member_variables.setter
     def member_variables(self, memVar):
         if isinstance(memVar, MemberVariable):
-            self.data_dictionary["member-variables"][memVar["name"]] = memVar
+            self.data_dictionary["member-variables"][memVar.member_name] = memVar.data_dictionary
         elif isinstance(memVar, dict):
-            self.data_dictionar["member-variables"].update(memVar)
+            self.data_dictionary["member-variables"].update(memVar)
         else:
             raise TypeError('memVar must of type MemberVariable or a data dictionary')
         return
@@ -664,16 +800,13 @@ class GenClass:
     @property
     def functions(self):
         '''
-        :return Function list:
+        :return Function tuple: cached wrappers, rebuilt only when the
+            functions dictionary changes
         '''
+        if self._functionViews is None:
+            self._functionViews = WrapperViews(Function)
         
-        retVal = []
-        for key, val in self.data_dictionary["functions"].items():
-            newFunc = Function()
-            newFunc.data_dictionary = val
-            retVal.append(newFunc)
-        
-        return retVal
+        return self._functionViews.all(self.data_dictionary["functions"])
     
     def functions_as_dict(self):
         '''
@@ -684,7 +817,7 @@ class GenClass:
     @functions.setter
     def functions(self, func):
         if isinstance(func, Function):
-            self.data_dictionary["functions"][func["name"]] = func
+            self.data_dictionary["functions"][func.function_name] = func.data_dictionary
         elif isinstance(func, dict):
             self.data_dictionary["functions"].update(func)
         else:
@@ -715,6 +848,8 @@ class GenClass:
             "member-variables":{},
             "functions":{}
         }
+        self._memberViews = None
+        self._functionViews = None
 
         return
     
@@ -725,6 +860,9 @@ class GenClass:
         
         return retVal
 
+#class data dictionary keys of the values in each GenProject.from_records row
+classRecordFields = ("name", "namespace", "subdirectory", "base-classes", "system-includes", "dependencies")
+
 class GenProject:
     '''
     GenProject represents a collection of related C/C++ classes, aka project.
@@ -738,21 +876,137 @@ class GenProject:
     default-definition-template         definition-template
     default-implementation-template     implementation-template
     default-namespace                   namespace
+    
+    default-base-definition-template and default-base-implementation-template
+    are rendered once for each base class of a class, into the <base-classes>
+    part of its definition and implementation. They are optional.
     '''
     
-    def import_config(self):
+    def import_config(self, stream=False):
+        '''
+        Loads the project from the config file, or from a directory of class
+        shards (see genie_config). Classes listed as shards are only read when
+        they are needed.
+        
+        :param stream boolean: read the project settings now and the classes
+            one at a time as they are asked for (iter_gen_class), so classes
+            can be generated before a huge config is fully parsed. The
+            settings must come before "classes" in the file.
+        '''
         if not self.config:
             raise ValueError('config cannot be empty. GenProject')
         
         if  not self.config.find('json'):
             raise ValueError('config must be a json file')
 
-        import json
-        with open(self.config, 'r') as inFile:
-            self.data_dictionary = json.load(inFile)
+        import os
+        from genie_config import load_json, ConfigStream, load_project_dir, resolve_class_shards
+        
+        self._configStream = None
+        self._classStream = None
+        self._classShards = {}
+        
+        if os.path.isdir(self.config):
+            self.data_dictionary, self._classShards = load_project_dir(self.config)
+            self.data_dictionary["classes"] = TrackedDict(self.data_dictionary.get("classes", {}))
+            return
+        
+        if stream:
+            self._configStream = ConfigStream(self.config)
+            self.data_dictionary = self._configStream.settings()
+            self.data_dictionary["classes"] = TrackedDict()
+            self._classStream = self._configStream.classes()
+        else:
+            self.data_dictionary = load_json(self.config)
+            #converted while nothing else holds the dict yet
+            self.data_dictionary["classes"] = TrackedDict(self.data_dictionary.get("classes") or {})
+        
+        self._classShards = resolve_class_shards(self.config, self.data_dictionary.get("class-shards"))
 
         return
     
+    def _load_class(self, name):
+        '''
+        Reads the shard of a class into the classes dict.
+        
+        :param name string: class name
+        :return boolean: false if the class has no shard left to read
+        '''
+        if name not in self._classShards:
+            return False
+        
+        from genie_config import load_json
+        
+        path = self._classShards.pop(name)
+        self.data_dictionary["classes"][name] = load_json(path)
+        return True
+    
+    def _load_next_class(self):
+        '''
+        Reads the next class that isn't loaded yet, from the config stream first
+        and then from the class shards.
+        
+        :return string: class name, None when every class is loaded
+        :raise ValueError: if project settings follow "classes" in the config
+        '''
+        if self._classStream is not None:
+            for name, classDict in self._classStream:
+                self.data_dictionary["classes"][name] = classDict
+                return name
+            
+            trailing = self._configStream.finish()
+            self._configStream = None
+            self._classStream = None
+            if trailing:
+                raise ValueError(self.config + ': project settings ' + ", ".join(trailing) +
+                                 ' must come before "classes" to stream the config')
+        
+        classes = self.data_dictionary["classes"]
+        for name in list(self._classShards):
+            if name in classes:
+                #set directly on the project, the shard is out of date
+                del self._classShards[name]
+                continue
+            
+            self._load_class(name)
+            return name
+        
+        return None
+    
+    def class_names(self):
+        '''
+        :return list: names of every class in the project, without reading
+            class shards. Classes still in a config stream are not included.
+        '''
+        names = list(self.data_dictionary["classes"])
+        names.extend(name for name in self._classShards if name not in self.data_dictionary["classes"])
+        return names
+
+    def streaming(self):
+        '''
+        :return boolean: true while classes are still being read from a config
+            stream
+        '''
+        return self._classStream is not None
+
+    def iter_gen_class(self):
+        '''
+        Same classes as gen_class, but classes in a config stream or in class
+        shards are only read when the iteration reaches them.
+        
+        :return iterator GenClass: cached GenClass objects
+        '''
+        classes = self.data_dictionary["classes"]
+        for name in list(classes):
+            yield self._classViews.get(classes, name)
+        
+        while True:
+            name = self._load_next_class()
+            if name is None:
+                return
+            
+            yield self._classViews.get(self.data_dictionary["classes"], name)
+    
     @property
     def project_name(self):
         return self.data_dictionary["project-name"]
@@ -764,11 +1018,12 @@ class GenProject:
         Does some minimal checking for validity
         
         :param name string: name of variable
-        :raise ValueError: if name contains whitespace
+        :raise ValueError: if name is empty or contains whitespace
         '''
         
-        if contains_whitespace(name):
-            raise ValueError('name cannot contain whitespace.')
+        problem = check_name(name)
+        if problem:
+            raise ValueError(problem)
         
         self.data_dictionary["project-name"] = name
         return
@@ -818,6 +1073,24 @@ class GenProject:
         self.data_dictionary["default-implementation-template"] = val
         return
     
+    @property
+    def default_base_definition_template(self):
+        return self.data_dictionary.get("default-base-definition-template", "")
+    
+    @default_base_definition_template.setter
+    def default_base_definition_template(self, val):
+        self.data_dictionary["default-base-definition-template"] = val
+        return
+    
+    @property
+    def default_base_implementation_template(self):
+        return self.data_dictionary.get("default-base-implementation-template", "")
+    
+    @default_base_implementation_template.setter
+    def default_base_implementation_template(self, val):
+        self.data_dictionary["default-base-implementation-template"] = val
+        return
+    
     @property
     def default_namespace(self):
         return self.data_dictionary["default-namespace"]
@@ -848,29 +1121,33 @@ class GenProject:
     @property
     def gen_class(self):
         '''
-        :return list GenClass: list of GenClass objects
+        :return tuple GenClass: cached GenClass objects, rebuilt only when the
+            classes dictionary changes
         '''
-        retVal = []
-        for key, classDict in self.data_dictionary["classes"].items():
-            newClass = GenClass()
-            newClass.data_dictionary = classDict
-            retVal.append(newClass)
+        while self._load_next_class() is not None:
+            pass
         
-        return retVal
+        return self._classViews.all(self.data_dictionary["classes"])
     
     def find_gen_class(self, name):
-        retVal = GenClass()
+        classes = self.data_dictionary["classes"]
         
-        if name in self.data_dictionary["classes"]:
-            retVal.data_dictionary = self.data_dictionary["classes"][name]
+        if name not in classes and not self._load_class(name):
+            while name not in classes and self._load_next_class() is not None:
+                classes = self.data_dictionary["classes"]
         
-        return retVal
+        if name in classes:
+            return self._classViews.get(classes, name)
+        
+        return GenClass()
     
     def find_gen_class_as_dict(self, name):
         retVal = {}
         
+        #reads a streamed config far enough to find the class
+        gClass = self.find_gen_class(name)
         if name in self.data_dictionary["classes"]:
-            retVal = self.data_dictionary["classes"][name]
+            retVal = gClass.data_dictionary
         
         return retVal
     
@@ -886,28 +1163,100 @@ class GenProject:
         if not isinstance(newClass, GenClass):
             raise TypeError('newClass must of type GenClass')
 
-        #check that default values propogate to the class when an override isn't provided.
-        #class values should take precedence
-        if not newClass.class_license:
-            newClass.class_license = self.default_license
-            
-        if not newClass.definition_template:
-            newClass.definition_template = self.default_definition_template
-            
-        if not newClass.implementation_template:
-            newClass.implementation_template = self.default_implementation_template
-            
-        if not newClass.namespace:
-            newClass.namespace = self.default_namespace
-            
-        if not newClass.grammar_file:
-            newClass.grammar_file = self.default_grammar_file
-             
-        self.data_dictionary["classes"][newClass.name] = newClass.data_dictionary
+        self.add_classes([newClass])
             
         return
     
-    def __init__(self, configPath = None):
+    def add_classes(self, classes):
+        '''
+        Adds many classes in one call. Same as setting gen_class for each one,
+        but the project defaults are looked up once, every name is checked
+        before anything is added and the classes dictionary is updated in one
+        step. Existing classes with the same names are overwritten.
+        
+        :param classes iterable: GenClass objects or class data dictionaries
+        :return list: names of the classes added, in order
+        :raises TypeError: if an item isn't a GenClass or a dictionary
+        :raises ValidationError: naming every class whose name isn't a legal
+            C++ identifier. No class is added then.
+        '''
+        added = {}
+        for newClass in classes:
+            if isinstance(newClass, GenClass):
+                classDict = newClass.data_dictionary
+            elif isinstance(newClass, dict):
+                classDict = newClass
+            else:
+                raise TypeError('classes must be of type GenClass or dict')
+            
+            added[classDict.get("name")] = classDict
+        
+        violations = check_names(("class", name) for name in added)
+        if violations:
+            raise ValidationError(violations)
+        
+        #class values take precedence, defaults fill in anything left empty
+        defaults = (
+            ("class-license", self.default_license),
+            ("definition-template", self.default_definition_template),
+            ("implementation-template", self.default_implementation_template),
+            ("namespace", self.default_namespace),
+            ("grammar-file", self.default_grammar_file)
+        )
+        for classDict in added.values():
+            for key, value in defaults:
+                if not classDict.get(key):
+                    classDict[key] = value
+        
+        self.data_dictionary["classes"].update(added)
+        
+        return list(added)
+    
+    @classmethod
+    def from_dicts(cls, classDicts, settings=None):
+        '''
+        Builds a project from class data dictionaries. Keys a dictionary leaves
+        out get the same values as a new GenClass. The dictionaries passed in
+        aren't modified.
+        
+        :param classDicts iterable: class data dictionaries
+        :param settings dict: project settings, ie "project-name". Anything not
+            given keeps the GenProject default.
+        :return GenProject: new project holding the classes
+        '''
+        project = cls()
+        if settings:
+            project.data_dictionary.update((key, value) for key, value in settings.items() if key != "classes")
+        
+        template = GenClass().data_dictionary
+        
+        def completed():
+            for classDict in classDicts:
+                #the template only holds empty lists and dicts, a shallow copy
+                #of each is enough to keep classes from sharing them
+                newDict = {key : value.copy() if isinstance(value, (list, dict)) else value
+                           for key, value in template.items() if key not in classDict}
+                newDict.update(classDict)
+                yield newDict
+        
+        project.add_classes(completed())
+        
+        return project
+    
+    @classmethod
+    def from_records(cls, records, fields=classRecordFields, settings=None):
+        '''
+        Builds a project from rows of class values, ie from a csv file or a
+        database query.
+        
+        :param records iterable: sequences of values, in fields order
+        :param fields tuple: class data dictionary keys of the values
+        :param settings dict: project settings, see from_dicts
+        :return GenProject: new project holding the classes
+        '''
+        return cls.from_dicts((dict(zip(fields, record)) for record in records), settings)
+    
+    def __init__(self, configPath = None, streamConfig = False):
         self.data_dictionary = {
             "project-name":"TestGenPyProject",
             "default-license":"license.txt",
@@ -915,16 +1264,22 @@ class GenProject:
             "template-location":"../templates",
             "default-definition-template":"definition.template",
             "default-implementation-template":"impl.template",
+            "default-base-definition-template":"baseDefinition.template",
+            "default-base-implementation-template":"baseImpl.template",
             "default-namespace":"test",
             "default-grammar-file":"grammar.json",
             "language":"c++",
-            "classes":{}
+            "classes":TrackedDict()
         }
+        self._classViews = WrapperViews(GenClass)
+        self._configStream = None
+        self._classStream = None
+        self._classShards = {}
 
         self.config = configPath
         
         if self.config:
-            self.import_config()
+            self.import_config(streamConfig)
         
         return
 
@@ -0,0 +1,289 @@
+'''
+:module genie_config:
+Loading of project config files.
+
+load_json parses a whole file with the fastest json library available. orjson
+and ujson are used when they are installed, otherwise the standard library
+json module. Backends are tried in jsonBackends order, set_json_backend forces
+one.
+
+ConfigStream parses a config one class at a time instead, so classes can be
+generated while the rest of a very large config is still being read. The
+project settings have to come before the "classes" object, as they do in
+xml/config.json.
+
+Projects can also be split into one json file per class (shards) that are only
+read when a class is needed. Either point GenProject at a directory holding
+project.json (the settings) and one <ClassName>.json per class, or list the
+shards in a normal config:
+
+"class-shards":{
+    "ExampleClass":"classes/ExampleClass.json"
+}
+
+Shard paths are relative to the config file. A shard holds what would be the
+class entry under "classes".
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import json
+import os
+import re
+
+#json libraries in order of preference
+jsonBackends = ("orjson", "ujson", "json")
+
+_backend = None
+
+def _import_backend(name):
+    '''
+    :param name string: one of jsonBackends
+    :return callable: loads function taking bytes, or None if not installed
+    '''
+    try:
+        module = __import__(name)
+    except ImportError:
+        return None
+
+    return module.loads
+
+def set_json_backend(name=None):
+    '''
+    :param name string: one of jsonBackends, or None to use the first one that
+        is installed
+    :return string: name of the backend in use
+    :raise ValueError: if the named backend is unknown or not installed
+    '''
+    global _backend
+
+    names = jsonBackends if name is None else (name,)
+    for backendName in names:
+        if backendName not in jsonBackends:
+            raise ValueError('unknown json backend: ' + backendName)
+
+        loads = _import_backend(backendName)
+        if loads is not None:
+            _backend = (backendName, loads)
+            return backendName
+
+    raise ValueError('json backend is not installed: ' + str(name))
+
+def json_backend():
+    '''
+    :return string: name of the backend load_json uses
+    '''
+    if _backend is None:
+        set_json_backend()
+
+    return _backend[0]
+
+def load_json(path):
+    '''
+    :param path string: json file
+    :return dict: parsed file
+    '''
+    if _backend is None:
+        set_json_backend()
+
+    with open(path, "rb") as f:
+        return _backend[1](f.read())
+
+#settings file of a sharded project directory
+projectShardFile = "project.json"
+
+def resolve_class_shards(configPath, shards):
+    '''
+    :param configPath string: config file the shards are listed in
+    :param shards dict: class name -> shard path relative to the config file
+    :return dict: class name -> absolute shard path, in config order
+    '''
+    baseDir = os.path.dirname(os.path.abspath(configPath))
+    return {name : os.path.join(baseDir, path) for name, path in (shards or {}).items()}
+
+def load_project_dir(path):
+    '''
+    Reads the settings of a sharded project directory and lists its shards
+    without reading them.
+
+    :param path string: directory holding project.json and <ClassName>.json files
+    :return tuple: (settings dict, class name -> absolute shard path)
+    '''
+    settingsFile = os.path.join(path, projectShardFile)
+    settings = load_json(settingsFile) if os.path.isfile(settingsFile) else {}
+
+    shards = resolve_class_shards(settingsFile, settings.get("class-shards"))
+    for fileName in sorted(os.listdir(path)):
+        name, extension = os.path.splitext(fileName)
+        if extension == ".json" and fileName != projectShardFile and name not in shards:
+            shards[name] = os.path.join(os.path.abspath(path), fileName)
+
+    return settings, shards
+
+_whitespace = re.compile(r"\s*")
+_numberTail = re.compile(r"[0-9.eE+\-]*\Z")
+
+class ConfigStream:
+    '''
+    ConfigStream is an incremental parser for project config files. The file is
+    read in blocks and only the class currently being parsed has to fit in
+    memory at once.
+
+    stream = ConfigStream("config.json")
+    settings = stream.settings()        #everything before "classes"
+    for name, classDict in stream.classes():
+        ...
+    trailing = stream.finish()          #anything after "classes"
+    '''
+
+    blockSize = 1 << 16
+
+    def __init__(self, path):
+        '''
+        :param path string: json config file
+        '''
+        self.path = path
+        self.file = open(path, "r", encoding="utf-8")
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        self.inClasses = False
+        self.done = False
+        return
+
+    def _fill(self):
+        '''
+        Reads another block, at least as large as what is buffered so reading a
+        big value takes a linear number of retries.
+
+        :return boolean: false at end of file
+        '''
+        if self.eof:
+            return False
+
+        data = self.file.read(max(self.blockSize, len(self.buffer) - self.pos))
+        if not data:
+            self.eof = True
+            self.file.close()
+            return False
+
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        '''
+        :return string: next character that isn't whitespace, "" at end of file
+        '''
+        while True:
+            self.pos = _whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError('{0}: expected {1!r} but found {2!r}'.format(self.path, chars, char))
+
+        self.pos += 1
+        return char
+
+    def _value(self):
+        '''
+        :return object: next json value in the file
+        '''
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self._fill():
+                    continue
+                raise
+
+            #a number at the end of the buffer might continue in the next block.
+            #"12." or "1e" decode as the 12 or 1 in front, so anything left
+            #that could still be part of the number means reading more
+            if (isinstance(value, (int, float)) and _numberTail.match(self.buffer, end)
+                    and self._fill()):
+                continue
+
+            self.pos = end
+            return value
+
+    def _members(self):
+        '''
+        Walks the "key": value pairs of the object the stream is in.
+
+        :return iterator: keys. The caller has to read the value of each key.
+        '''
+        first = True
+        while True:
+            if self._peek() == "}":
+                self.pos += 1
+                return
+
+            if not first:
+                self._expect(",")
+                if self._peek() == "}":
+                    self.pos += 1
+                    return
+
+            first = False
+            key = self._value()
+            self._expect(":")
+            yield key
+
+    def settings(self):
+        '''
+        Parses the project settings up to the start of the "classes" object.
+
+        :return dict: settings found before "classes"
+        '''
+        self._expect("{")
+        self._topLevel = self._members()
+
+        settings = {}
+        for key in self._topLevel:
+            if key == "classes":
+                self._expect("{")
+                self.inClasses = True
+                break
+
+            settings[key] = self._value()
+
+        return settings
+
+    def classes(self):
+        '''
+        :return iterator: (name, class dictionary) tuples in file order
+        '''
+        if not self.inClasses:
+            return
+
+        for name in self._members():
+            yield name, self._value()
+
+        self.inClasses = False
+        return
+
+    def finish(self):
+        '''
+        Parses whatever follows the "classes" object.
+
+        :return dict: settings found after "classes"
+        '''
+        trailing = {}
+        if not self.done:
+            for key in self._topLevel:
+                trailing[key] = self._value()
+            self.done = True
+
+        if not self.eof:
+            self.file.close()
+
+        return trailing
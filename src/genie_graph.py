@@ -0,0 +1,119 @@
+'''
+:module genie_graph:
+Dependency graph of the classes in a project, built from the "base-classes"
+and "dependencies" lists of each class. Names that aren't classes in the
+project (std::string, third party types, ...) are ignored.
+
+Classes are generated in topological waves. Every class in a wave only depends
+on classes in earlier waves, so base classes are always generated before the
+classes that derive from them and the classes of one wave can be generated in
+parallel.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+
+def class_graph(project):
+    '''
+    :param project GenProject: project data. Every class is loaded.
+    :return dict: class name -> list of project classes it depends on, in
+        project order
+    '''
+    classes = project.gen_class
+    names = set(gClass.name for gClass in classes)
+
+    graph = {}
+    for gClass in classes:
+        depends = []
+        for name in list(gClass.base_classes) + list(gClass.dependencies):
+            if name in names and name != gClass.name and name not in depends:
+                depends.append(name)
+        graph[gClass.name] = depends
+
+    return graph
+
+def find_cycle(graph):
+    '''
+    :param graph dict: see class_graph
+    :return list: class names making up a dependency cycle, first name
+        repeated at the end, or None if the graph has no cycles
+    '''
+    visiting = 1
+    done = 2
+    state = {}
+
+    for start in graph:
+        if start in state:
+            continue
+
+        path = [start]
+        stack = [iter(graph[start])]
+        state[start] = visiting
+        while stack:
+            name = next(stack[-1], None)
+            if name is None:
+                state[path.pop()] = done
+                stack.pop()
+            elif state.get(name) == visiting:
+                return path[path.index(name):] + [name]
+            elif name not in state:
+                state[name] = visiting
+                path.append(name)
+                stack.append(iter(graph[name]))
+
+    return None
+
+def topological_waves(graph):
+    '''
+    :param graph dict: see class_graph
+    :return list: lists of class names. Classes in a wave only depend on
+        classes in earlier waves. Each wave is in project order.
+    :raise ValueError: if the classes have a dependency cycle
+    '''
+    cycle = find_cycle(graph)
+    if cycle:
+        raise ValueError('dependency cycle: ' + " -> ".join(cycle))
+
+    order = {name : index for index, name in enumerate(graph)}
+    remaining = {name : len(depends) for name, depends in graph.items()}
+    dependents = {name : [] for name in graph}
+    for name, depends in graph.items():
+        for depend in depends:
+            dependents[depend].append(name)
+
+    waves = []
+    wave = [name for name, count in remaining.items() if not count]
+    while wave:
+        waves.append(wave)
+        nextWave = []
+        for name in wave:
+            for dependent in dependents[name]:
+                remaining[dependent] -= 1
+                if not remaining[dependent]:
+                    nextWave.append(dependent)
+        wave = sorted(nextWave, key=order.__getitem__)
+
+    return waves
+
+def with_dependents(graph, names):
+    '''
+    :param graph dict: see class_graph
+    :param names iterable: class names
+    :return set: names plus every class that depends on them, directly or
+        through other classes
+    '''
+    dependents = {name : [] for name in graph}
+    for name, depends in graph.items():
+        for depend in depends:
+            dependents[depend].append(name)
+
+    found = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name in found:
+            continue
+        found.add(name)
+        stack.extend(dependents.get(name, ()))
+
+    return found
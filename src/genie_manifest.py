@@ -0,0 +1,135 @@
+'''
+:module genie_manifest:
+Records what was generated by the last run of a project so classes whose
+inputs haven't changed can be skipped. Rewriting an unchanged file would touch
+its mtime and make the downstream C++ build recompile it.
+
+The manifest is a json file stored next to the project directory, ie
+<project-directory>/.<project-name>.manifest.json. Each class entry holds a
+hash of the class data dictionary, the project settings and the contents of
+the template, grammar and license files the class uses.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import hashlib
+import json
+import os
+
+manifestVersion = 1
+
+def manifest_path(project):
+    '''
+    :param project GenProject: project data
+    :return string: path of the project manifest file
+    '''
+    projectDir = os.path.abspath(project.project_directory)
+    return os.path.join(projectDir, "." + project.project_name + ".manifest.json")
+
+def class_digest(project, gClass):
+    '''
+    :param project GenProject: project data
+    :param gClass GenClass: class data
+    :return string: sha1 hex digest of everything that goes into the class output
+    '''
+    from genie_templates import templateCache
+    from genie_writers import class_inputs
+
+    settings = dict(project.data_dictionary)
+    settings.pop("classes", None)
+
+    digest = hashlib.sha1()
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    digest.update(json.dumps(gClass.data_dictionary, sort_keys=True).encode("utf-8"))
+
+    for key, path in sorted(class_inputs(project, gClass).items()):
+        fileDigest = templateCache.digest(path) if path else ""
+        digest.update((key + "=" + fileDigest + "\n").encode("utf-8"))
+
+    return digest.hexdigest()
+
+class Manifest:
+    '''
+    Manifest is the class name -> {digest, outputs} table from the last run.
+    A missing or unreadable manifest file is treated as empty, which just means
+    every class gets generated.
+    '''
+
+    def __init__(self, path):
+        '''
+        :param path string: manifest file, see manifest_path
+        '''
+        self.path = path
+        self.classes = {}
+        self.load()
+        return
+
+    def load(self):
+        self.classes = {}
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") == manifestVersion:
+            self.classes = data.get("classes", {})
+
+        return
+
+    def save(self):
+        '''
+        Writes the manifest to a temp file and renames it over the old one so an
+        interrupted run never leaves a half written manifest behind.
+        '''
+        parentDir = os.path.dirname(self.path)
+        if not os.path.isdir(parentDir):
+            os.makedirs(parentDir)
+
+        tempPath = self.path + ".tmp"
+        with open(tempPath, "w") as f:
+            json.dump({"version" : manifestVersion, "classes" : self.classes},
+                      f, indent=4, sort_keys=True)
+
+        os.replace(tempPath, self.path)
+        return
+
+    def is_current(self, name, digest, outputs):
+        '''
+        :param name string: class name
+        :param digest string: class_digest of the class
+        :param outputs dict: output files the class generates
+        :return boolean: true if the class was generated from the same inputs
+            and all of its output files still exist
+        '''
+        entry = self.classes.get(name)
+        if not entry:
+            return False
+
+        if entry["digest"] != digest or entry["outputs"] != outputs:
+            return False
+
+        return all(os.path.isfile(path) for path in outputs.values())
+
+    def record(self, name, digest, outputs):
+        '''
+        :param name string: class name
+        :param digest string: class_digest of the class
+        :param outputs dict: output files the class generated
+        '''
+        self.classes[name] = {"digest" : digest, "outputs" : outputs}
+        return
+
+    def prune(self, names):
+        '''
+        Drops entries for classes that are no longer in the project.
+
+        :param names iterable: names of the classes in the project
+        '''
+        names = set(names)
+        for name in list(self.classes):
+            if name not in names:
+                del self.classes[name]
+
+        return
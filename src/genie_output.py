@@ -0,0 +1,726 @@
+'''
+:module genie_output:
+Output layer for the writers. Generated files are only written when their
+contents change, so make/cmake don't rebuild translation units that came out
+the same as last time.
+
+Output goes to one of these targets:
+OutputSink      files in the project directory
+ThreadedSink    files in the project directory, written by a pool of threads
+MemorySink      a dictionary of file name -> contents, for API users and tests
+DiffSink        nothing, the files are compared with the ones already in the
+                project directory to report what a run would change
+ArchiveSink     one .tar (optionally compressed) or .zip file, written in a
+                single sequential pass
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import hashlib
+import os
+import tempfile
+
+#hash DiffSink compares files with. xxhash is used when it's installed
+try:
+    from xxhash import xxh3_128 as _fastHash
+except ImportError:
+    _fastHash = hashlib.sha1
+
+#file status values reported by OutputSink.write
+NEW = "new"
+WRITTEN = "written"
+UNCHANGED = "unchanged"
+
+#reported by ThreadedSink.write, the file is counted once a writer gets to it
+QUEUED = "queued"
+
+#permissions for newly created files, same as open(path, "w") would give
+_umask = os.umask(0)
+os.umask(_umask)
+_newFileMode = 0o666 & ~_umask
+
+def _same_contents(path, data):
+    '''
+    :param path string: existing file
+    :param data bytes: rendered contents
+    :return boolean: true if the file already holds data. Sizes are compared
+        before reading the file.
+    '''
+    if os.path.getsize(path) != len(data):
+        return False
+
+    return _file_digest(path) == hashlib.sha1(data).digest()
+
+def _file_digest(path, hasher=hashlib.sha1):
+    '''
+    :param path string: existing file
+    :param hasher callable: hashlib style constructor
+    :return bytes: digest of the file, read in blocks
+    '''
+    digest = hasher()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+
+    return digest.digest()
+
+def atomic_write(path, data):
+    '''
+    Writes data to a temp file in the same directory and renames it over path,
+    so readers never see a partially written file.
+
+    :param path string: file to write
+    :param data bytes: contents
+    '''
+    parentDir = os.path.dirname(path)
+    fd, tempPath = tempfile.mkstemp(dir=parentDir, prefix="." + os.path.basename(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        if os.path.exists(path):
+            os.chmod(tempPath, os.stat(path).st_mode & 0o7777)
+        else:
+            os.chmod(tempPath, _newFileMode)
+
+        os.replace(tempPath, path)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+    return
+
+class OutputSink:
+    '''
+    OutputSink writes generated files, skipping files whose contents are
+    unchanged, and counts how many files were new, rewritten or unchanged
+    along with the number of bytes actually written.
+    '''
+
+    #false for targets that don't leave files in the project directory. Their
+    #output can't be compared with the last run, so every class is written
+    writesFiles = True
+
+    def __init__(self, fsync=False):
+        '''
+        :param fsync boolean: flush every written file and its directory to disk
+            when the sink is closed
+        '''
+        self.counts = {NEW : 0, WRITTEN : 0, UNCHANGED : 0}
+        self.bytesWritten = 0
+        self.fsync = fsync
+        #output file -> exception, for files that couldn't be written
+        self.errors = {}
+        self.madeDirs = set()
+        self.writtenPaths = []
+        #output files are named relative to root by targets that aren't the
+        #filesystem. write_project sets it to the project directory.
+        self.root = None
+        return
+
+    def _name(self, path):
+        '''
+        :param path string: absolute output file
+        :return string: path relative to root with / separators, or path
+            unchanged if there is no root
+        '''
+        if self.root is None:
+            return path
+
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _record(self, path, status, size, record=None):
+        '''
+        Counts a finished file.
+
+        :param path string: output file
+        :param status string: NEW, WRITTEN or UNCHANGED
+        :param size int: bytes written, 0 if unchanged
+        :param record dict: profiler record the bytes are added to
+        '''
+        self.counts[status] += 1
+        self.bytesWritten += size
+        if status != UNCHANGED:
+            self.writtenPaths.append(path)
+        if record is not None:
+            record["bytes"] += size
+        return
+
+    def make_dir(self, path):
+        '''
+        Creates a directory for output files. Each directory is only checked
+        once per sink.
+
+        :param path string: directory
+        '''
+        if path not in self.madeDirs:
+            os.makedirs(path, exist_ok=True)
+            self.madeDirs.add(path)
+        return
+
+    def make_dirs(self, paths):
+        '''
+        Creates every directory output files will go in, in one pass. Parents
+        come before their subdirectories, so each directory takes a single
+        mkdir once its parent is known to exist. Writes to these directories
+        never stat the filesystem afterwards.
+
+        :param paths iterable: directories
+        '''
+        for path in sorted(set(paths) - self.madeDirs):
+            if os.path.dirname(path) in self.madeDirs:
+                try:
+                    os.mkdir(path)
+                except FileExistsError:
+                    if not os.path.isdir(path):
+                        raise
+            else:
+                os.makedirs(path, exist_ok=True)
+            self.madeDirs.add(path)
+        return
+
+    def _write_data(self, path, data, record=None):
+        '''
+        :param path string: output file. Its directory must exist.
+        :param data bytes: rendered contents
+        :param record dict: profiler record the bytes written are added to
+        :return string: NEW, WRITTEN or UNCHANGED
+        '''
+        if not os.path.isfile(path):
+            status = NEW
+        elif _same_contents(path, data):
+            status = UNCHANGED
+        else:
+            status = WRITTEN
+
+        if status != UNCHANGED:
+            atomic_write(path, data)
+
+        self._record(path, status, 0 if status == UNCHANGED else len(data), record)
+        return status
+
+    def write(self, path, text, record=None):
+        '''
+        :param path string: output file. Its directory must exist.
+        :param text string: rendered contents
+        :param record dict: profiler record the bytes written are added to
+        :return string: NEW, WRITTEN or UNCHANGED
+        '''
+        return self._write_data(path, text.encode("utf-8"), record)
+
+    def write_stream(self, path, chunks, record=None):
+        '''
+        Same as write, for output produced in chunks. The chunks are streamed to
+        a temp file while being hashed, and the temp file only replaces path if
+        the contents differ, so the whole file is never held in memory.
+
+        :param path string: output file. Its directory must exist.
+        :param chunks iterable: strings making up the rendered contents
+        :param record dict: profiler record the bytes written are added to
+        :return string: NEW, WRITTEN or UNCHANGED
+        '''
+        parentDir = os.path.dirname(path)
+        fd, tempPath = tempfile.mkstemp(dir=parentDir, prefix="." + os.path.basename(path), suffix=".tmp")
+        try:
+            digest = hashlib.sha1()
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    data = chunk.encode("utf-8")
+                    digest.update(data)
+                    size += len(data)
+                    f.write(data)
+
+            if not os.path.isfile(path):
+                status = NEW
+            elif os.path.getsize(path) == size and _file_digest(path) == digest.digest():
+                status = UNCHANGED
+            else:
+                status = WRITTEN
+
+            if status == UNCHANGED:
+                os.remove(tempPath)
+            else:
+                if status == WRITTEN:
+                    os.chmod(tempPath, os.stat(path).st_mode & 0o7777)
+                else:
+                    os.chmod(tempPath, _newFileMode)
+                os.replace(tempPath, path)
+        except BaseException:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+            raise
+
+        self._record(path, status, 0 if status == UNCHANGED else size, record)
+        return status
+
+    def failed(self, paths):
+        '''
+        :param paths iterable: output files
+        :return boolean: true if any of them couldn't be written
+        '''
+        return any(path in self.errors for path in paths)
+
+    def _sync(self):
+        '''
+        Flushes the written files, then their directories so the renames are
+        on disk too.
+        '''
+        for path in self.writtenPaths:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        for directory in set(os.path.dirname(path) for path in self.writtenPaths):
+            #directories can't be opened on some platforms, ie windows
+            try:
+                fd = os.open(directory, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        self.writtenPaths = []
+        return
+
+    def close(self):
+        '''
+        Finishes writing. Files are flushed to disk here, once, if the sink was
+        made with fsync.
+        '''
+        if self.fsync:
+            self._sync()
+        return
+
+    def abort(self):
+        '''
+        Finishes after a failed run. Files already written stay, so this is the
+        same as close.
+        '''
+        self.close()
+        return
+
+    def merge(self, counts, bytesWritten=0):
+        '''
+        Adds counts from another sink, ie one used in a worker process.
+
+        :param counts dict: status -> number of files
+        :param bytesWritten int: bytes written by the other sink
+        '''
+        for status, count in counts.items():
+            self.counts[status] += count
+
+        self.bytesWritten += bytesWritten
+
+        return
+
+    def summary(self):
+        '''
+        :return string: one line description of the counts
+        '''
+        return "Files: {0} new, {1} written, {2} unchanged".format(
+            self.counts[NEW], self.counts[WRITTEN], self.counts[UNCHANGED])
+
+class ThreadedSink(OutputSink):
+    '''
+    ThreadedSink hands files to a pool of writer threads, so rendering carries
+    on while earlier files are compared and written. Opening, hashing and
+    renaming small files is mostly waiting on the filesystem, which threads
+    overlap well, network filesystems in particular.
+
+    Files wait in a bounded queue. When the writers fall behind, write blocks
+    until there is room, so rendered files never pile up in memory. Counts and
+    errors are only complete after close, which waits for the writers and
+    raises the first error any of them hit.
+
+    write_stream writes in the calling thread, since its chunks are produced
+    as the file is rendered.
+    '''
+
+    def __init__(self, writers=4, queueSize=None, fsync=False):
+        '''
+        :param writers int: number of writer threads
+        :param queueSize int: files that can wait for a writer before write
+            blocks. Defaults to 16 per writer.
+        :param fsync boolean: see OutputSink
+        '''
+        import queue
+        import threading
+
+        OutputSink.__init__(self, fsync)
+        writers = max(1, writers)
+        self.queue = queue.Queue(queueSize or writers * 16)
+        self.lock = threading.Lock()
+        self.closed = False
+        self.threads = [threading.Thread(target=self._drain, name="genie-writer-" + str(i), daemon=True)
+                        for i in range(writers)]
+        for thread in self.threads:
+            thread.start()
+        return
+
+    def _record(self, path, status, size, record=None):
+        with self.lock:
+            OutputSink._record(self, path, status, size, record)
+        return
+
+    def _drain(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+
+            path, data, record = job
+            try:
+                self._write_data(path, data, record)
+            except Exception as e:
+                with self.lock:
+                    self.errors[path] = e
+
+    def _raise_error(self):
+        if self.errors:
+            raise next(iter(self.errors.values()))
+        return
+
+    def write(self, path, text, record=None):
+        '''
+        Queues a file for the writers. Blocks while the queue is full.
+
+        :param path string: output file. Its directory must exist.
+        :param text string: rendered contents
+        :param record dict: profiler record the bytes written are added to,
+            once the file is written
+        :return string: QUEUED
+        :raise Exception: the first error a writer hit, so a run stops soon
+            after a file fails
+        '''
+        if self.closed:
+            raise ValueError('write to a closed sink')
+
+        self._raise_error()
+        self.queue.put((path, text.encode("utf-8"), record))
+        return QUEUED
+
+    def close(self):
+        '''
+        Waits for the queued files to be written, then flushes them to disk if
+        the sink was made with fsync.
+
+        :raise Exception: the first error a writer hit
+        '''
+        if not self.closed:
+            self.closed = True
+            for thread in self.threads:
+                self.queue.put(None)
+            for thread in self.threads:
+                thread.join()
+
+            if self.fsync and not self.errors:
+                self._sync()
+
+        self._raise_error()
+        return
+
+class MemorySink(OutputSink):
+    '''
+    MemorySink keeps the generated files in the files dictionary, name ->
+    text. Names are relative to root when it's set, absolute paths otherwise.
+    Writing the same contents to a name twice reports UNCHANGED.
+    '''
+
+    writesFiles = False
+
+    def __init__(self, root=None):
+        '''
+        :param root string: directory file names are relative to
+        '''
+        OutputSink.__init__(self)
+        self.root = root
+        self.files = {}
+        return
+
+    def make_dir(self, path):
+        return
+
+    def make_dirs(self, paths):
+        return
+
+    def write(self, path, text, record=None):
+        name = self._name(path)
+        if name not in self.files:
+            status = NEW
+        elif self.files[name] == text:
+            status = UNCHANGED
+        else:
+            status = WRITTEN
+
+        self.files[name] = text
+        self._record(name, status, 0 if status == UNCHANGED else len(text.encode("utf-8")), record)
+        return status
+
+    def write_stream(self, path, chunks, record=None):
+        return self.write(path, "".join(chunks), record)
+
+    def close(self):
+        return
+
+class DiffSink(OutputSink):
+    '''
+    DiffSink writes nothing. Each generated file is compared with the file
+    already at its path, sizes first and then a fast hash of the contents, and
+    new or changed files are reported, as their names or as unified diffs.
+    The counts and bytesWritten are what a real run would do.
+    '''
+
+    writesFiles = False
+
+    def __init__(self, diff=False, out=None, root=None):
+        '''
+        :param diff boolean: report unified diffs instead of file names
+        :param out file: text stream changes are written to as they are found.
+            When None they are kept in changes.
+        :param root string: directory file names are relative to
+        '''
+        OutputSink.__init__(self)
+        self.diff = diff
+        self.out = out
+        self.root = root
+        #(name, NEW or WRITTEN, file name or diff text) for each change
+        self.changes = []
+        return
+
+    def make_dir(self, path):
+        return
+
+    def make_dirs(self, paths):
+        return
+
+    def _report(self, path, status, text):
+        '''
+        :param path string: output file
+        :param status string: NEW or WRITTEN
+        :param text string: generated contents
+        '''
+        import difflib
+
+        name = self._name(path)
+        if not self.diff:
+            report = name + "\n"
+        else:
+            if status == NEW:
+                oldLines = []
+                fromFile = "/dev/null"
+            else:
+                with open(path, "r", errors="replace") as f:
+                    oldLines = f.read().splitlines(True)
+                fromFile = "a/" + name
+            report = "".join(difflib.unified_diff(oldLines, text.splitlines(True), fromFile, "b/" + name))
+            if report and not report.endswith("\n"):
+                report += "\n\\ No newline at end of file\n"
+
+        if self.out is None:
+            self.changes.append((name, status, report))
+        else:
+            self.out.write(report)
+        return
+
+    def write(self, path, text, record=None):
+        data = text.encode("utf-8")
+        if not os.path.isfile(path):
+            status = NEW
+        elif os.path.getsize(path) == len(data) and _file_digest(path, _fastHash) == _fastHash(data).digest():
+            status = UNCHANGED
+        else:
+            status = WRITTEN
+
+        self._record(path, status, 0 if status == UNCHANGED else len(data), record)
+        if status != UNCHANGED:
+            self._report(path, status, text)
+        return status
+
+    def write_stream(self, path, chunks, record=None):
+        return self.write(path, "".join(chunks), record)
+
+    def close(self):
+        return
+
+    def summary(self):
+        '''
+        :return string: one line description of what a real run would do
+        '''
+        return "Dry run: {0} new, {1} changed, {2} unchanged files, {3} bytes would be written".format(
+            self.counts[NEW], self.counts[WRITTEN], self.counts[UNCHANGED], self.bytesWritten)
+
+#archive file extensions -> (format, tarfile mode)
+archiveFormats = (
+    (".tar.gz", ("tar", "w|gz")),
+    (".tgz", ("tar", "w|gz")),
+    (".tar.bz2", ("tar", "w|bz2")),
+    (".tar.xz", ("tar", "w|xz")),
+    (".tar", ("tar", "w|")),
+    (".zip", ("zip", None))
+)
+
+def archive_format(path):
+    '''
+    :param path string: archive file name
+    :return tuple: (format, tarfile mode) for the extension of path, None if
+        it isn't an archive
+    '''
+    lowerPath = path.lower()
+    for extension, archiveFormat in archiveFormats:
+        if lowerPath.endswith(extension):
+            return archiveFormat
+
+    return None
+
+class ArchiveSink(OutputSink):
+    '''
+    ArchiveSink writes every generated file into one archive, opened once and
+    written front to back, instead of creating a file per class. The archive
+    is written to a temp file next to path and renamed over it on close, so a
+    failed run leaves the previous archive in place.
+
+    Members are named relative to root. Their mtime is SOURCE_DATE_EPOCH when
+    that is set, so archives of the same output can be made byte identical.
+    '''
+
+    writesFiles = False
+
+    def __init__(self, path, root=None, fsync=False):
+        '''
+        :param path string: .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz or .zip file
+        :param root string: directory member names are relative to
+        :param fsync boolean: flush the archive to disk when it's closed
+        :raise ValueError: if path doesn't have an archive extension
+        '''
+        import time
+
+        archiveFormat = archive_format(path)
+        if archiveFormat is None:
+            raise ValueError('unknown archive type: ' + path)
+
+        OutputSink.__init__(self, fsync)
+        self.path = os.path.abspath(path)
+        self.root = root
+        self.format = archiveFormat[0]
+        self.mtime = int(os.environ.get("SOURCE_DATE_EPOCH") or time.time())
+        self.names = set()
+
+        parentDir = os.path.dirname(self.path)
+        fd, self.tempPath = tempfile.mkstemp(dir=parentDir, prefix="." + os.path.basename(self.path), suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+
+        if self.format == "zip":
+            import zipfile
+            self.archive = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED)
+        else:
+            import tarfile
+            self.archive = tarfile.open(fileobj=self.file, mode=archiveFormat[1], format=tarfile.PAX_FORMAT)
+
+        return
+
+    def make_dir(self, path):
+        return
+
+    def make_dirs(self, paths):
+        return
+
+    def _add(self, path, data, record=None):
+        '''
+        :param path string: output file
+        :param data bytes: contents
+        :param record dict: profiler record the bytes written are added to
+        :return string: NEW
+        :raise ValueError: if the archive already has a member with the name
+        '''
+        import io
+
+        name = self._name(path)
+        if name in self.names:
+            raise ValueError('duplicate archive member: ' + name)
+        self.names.add(name)
+
+        if self.format == "zip":
+            import zipfile
+            info = zipfile.ZipInfo(name, _zip_time(self.mtime))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = (0o100000 | _newFileMode) << 16
+            self.archive.writestr(info, data)
+        else:
+            import tarfile
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = self.mtime
+            info.mode = _newFileMode
+            self.archive.addfile(info, io.BytesIO(data))
+
+        self._record(name, NEW, len(data), record)
+        return NEW
+
+    def write(self, path, text, record=None):
+        return self._add(path, text.encode("utf-8"), record)
+
+    def write_stream(self, path, chunks, record=None):
+        '''
+        tar members need their size up front, so the chunks of one file are
+        joined before it's added.
+        '''
+        return self._add(path, "".join(chunks).encode("utf-8"), record)
+
+    def close(self):
+        '''
+        Finishes the archive and moves it into place.
+        '''
+        if self.archive is None:
+            return
+
+        try:
+            self.archive.close()
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.file.close()
+            os.chmod(self.tempPath, _newFileMode)
+            os.replace(self.tempPath, self.path)
+        except BaseException:
+            self.file.close()
+            if os.path.exists(self.tempPath):
+                os.remove(self.tempPath)
+            raise
+        finally:
+            self.archive = None
+
+        return
+
+    def abort(self):
+        '''
+        Drops the partial archive, leaving any previous one at path untouched.
+        '''
+        if self.archive is None:
+            return
+
+        try:
+            self.archive.close()
+        except Exception:
+            pass
+        finally:
+            self.archive = None
+            self.file.close()
+            if os.path.exists(self.tempPath):
+                os.remove(self.tempPath)
+
+        return
+
+def _zip_time(seconds):
+    '''
+    :param seconds int: unix time
+    :return tuple: zip member date_time. Zip can't store dates before 1980.
+    '''
+    import time
+
+    return max((1980, 1, 1, 0, 0, 0), tuple(time.localtime(seconds)[:6]))
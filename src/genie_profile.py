@@ -0,0 +1,159 @@
+'''
+:module genie_profile:
+Opt-in instrumentation for the writers. A Profiler handed to write_project or
+write_class gets one record per class with the time spent in each phase,
+the bytes written and the number of tag replacements:
+
+{
+    "class" : "ExampleClass",
+    "seconds" : {"grammar" : 0.0, "template" : 0.0, "substitute" : 0.0, "write" : 0.0},
+    "bytes" : 719,
+    "tags" : 24
+}
+
+Hooks added with Profiler.add_hook are called with each record as its class
+finishes, in project order.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import json
+import time
+
+#phases timed for each class, in the order they happen
+phases = ("grammar", "template", "substitute", "write")
+
+class _Timer:
+    __slots__ = ("record", "phase", "start")
+
+    def __init__(self, record, phase):
+        self.record = record
+        self.phase = phase
+        self.start = 0.0
+        return
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *excInfo):
+        self.record["seconds"][self.phase] += time.perf_counter() - self.start
+        return False
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        return False
+
+_noTimer = _NoTimer()
+
+def timed(record, phase):
+    '''
+    :param record dict: class record from Profiler.start_class, or None when
+        not profiling
+    :param phase string: one of phases
+    :return context manager: adds the time spent in the block to the record
+    '''
+    if record is None:
+        return _noTimer
+
+    return _Timer(record, phase)
+
+class Profiler:
+    '''
+    Profiler collects the per class records of a run and reports on them.
+    '''
+
+    def __init__(self):
+        self.records = []
+        self.hooks = []
+        return
+
+    def add_hook(self, hook):
+        '''
+        :param hook callable: called with each finished class record
+        '''
+        self.hooks.append(hook)
+        return
+
+    def start_class(self, name):
+        '''
+        :param name string: class name
+        :return dict: empty record for the class
+        '''
+        return {
+            "class" : name,
+            "seconds" : dict.fromkeys(phases, 0.0),
+            "bytes" : 0,
+            "tags" : 0
+        }
+
+    def finish_class(self, record):
+        '''
+        :param record dict: record from start_class, filled in by the writers
+        '''
+        self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+        return
+
+    def totals(self):
+        '''
+        :return dict: phase times, bytes and tags summed over every class
+        '''
+        seconds = dict.fromkeys(phases, 0.0)
+        for record in self.records:
+            for phase, value in record["seconds"].items():
+                seconds[phase] += value
+
+        return {
+            "classes" : len(self.records),
+            "seconds" : seconds,
+            "bytes" : sum(record["bytes"] for record in self.records),
+            "tags" : sum(record["tags"] for record in self.records)
+        }
+
+    def report(self):
+        '''
+        :return dict: totals and every class record, ready for json
+        '''
+        return {"totals" : self.totals(), "classes" : self.records}
+
+    def dump(self, path):
+        '''
+        :param path string: file the json report is written to
+        '''
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=4, sort_keys=True)
+        return
+
+    def summary(self, slowest=10):
+        '''
+        :param slowest int: number of slowest classes to list
+        :return string: table of the phase totals and the slowest classes
+        '''
+        totals = self.totals()
+        count = max(1, totals["classes"])
+        allSeconds = sum(totals["seconds"].values()) or 1.0
+
+        lines = ["{0:<12}{1:>12}{2:>12}{3:>8}".format("phase", "total s", "mean ms", "share")]
+        for phase in phases:
+            value = totals["seconds"][phase]
+            lines.append("{0:<12}{1:>12.4f}{2:>12.4f}{3:>7.1f}%".format(
+                phase, value, value / count * 1000.0, value / allSeconds * 100.0))
+
+        lines.append("classes: {0}  bytes written: {1}  tag replacements: {2}".format(
+            totals["classes"], totals["bytes"], totals["tags"]))
+
+        ranked = sorted(self.records, key=lambda record: sum(record["seconds"].values()), reverse=True)
+        if ranked[:slowest]:
+            lines.append("slowest classes:")
+            for record in ranked[:slowest]:
+                lines.append("  {0:<40}{1:>10.3f} ms".format(
+                    record["class"], sum(record["seconds"].values()) * 1000.0))
+
+        return "\n".join(lines)
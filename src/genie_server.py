@@ -0,0 +1,426 @@
+'''
+:module genie_server:
+Resident generator. class_genie.py --serve keeps projects, grammars and
+templates loaded between runs and generates classes for clients over a Unix
+domain socket or a local http endpoint. class_genie.py --server ADDRESS (or
+the CLASSGENIE_SERVER environment variable) turns a normal run into a request
+to that server, falling back to generating in process when no server answers.
+
+Addresses are either the path of a Unix socket or http://host:port. The Unix
+socket is only accessible to the user running the server. The http server only
+binds to loopback addresses, where any local user could connect, so it writes
+a random token to a file only that user can read (see token_path) and answers
+only requests sending it as "Authorization: Bearer <token>". It also turns
+away requests a web page could send to it: anything with an Origin header, a
+Host that isn't a loopback address or a Content-Type other than
+application/json.
+
+Over a Unix socket a request is one line of json, answered by one line of
+json. Over http a request is a POST to /generate with the json as the body.
+
+request:
+{
+    "config" : "/abs/path/config.json",
+    "cwd" : "/dir/the/client/ran/in",
+    "jobs" : 1,
+    "force" : false,
+    "stream" : false,
+    "writers" : 0,
+    "fsync" : false,
+    "archive" : null,
+    "stream-config" : false,
+    "only" : ["ExampleClass"],
+    "with-dependents" : false,
+    "snapshot" : null,
+    "validate" : false,
+    "profile" : false
+}
+
+response:
+{
+    "ok" : true,
+    "output" : "what the run printed",
+    "classes" : [{"class" : "ExampleClass", "bytes" : 719, ...}],
+    "profile" : {"totals" : ..., "classes" : ...},
+    "error" : null
+}
+
+"classes" has the genie_profile record of every class written. "profile" is
+only filled in when the request asks for it. With "validate" nothing is
+generated if a name in the project isn't valid, see genie_validation, and
+"error" lists every invalid name.
+
+Projects are reloaded when their config files or class shards change. Template
+and grammar files are checked on every use through genie_templates.templateCache.
+Requests are handled one at a time.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import hmac
+import json
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+#socket used by class_genie.py --serve when no address is given
+defaultAddress = ".classgenie.sock"
+
+#environment variable class_genie.py reads the server address from
+addressVariable = "CLASSGENIE_SERVER"
+
+_loopbackHosts = ("127.0.0.1", "localhost", "::1")
+
+def token_path(port):
+    '''
+    :param port int: port of an http server
+    :return string: file holding the token clients of that server send
+    '''
+    return os.path.join(os.path.expanduser("~"), ".classgenie-" + str(port) + ".token")
+
+def _write_token(path):
+    '''
+    :param path string: token file, replaced if it exists
+    :return string: new random token, written to path readable only by the user
+    '''
+    import secrets
+
+    token = secrets.token_hex(32)
+    if os.path.lexists(path):
+        os.unlink(path)
+    #O_EXCL so the mode applies, an existing file would keep its own
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+
+    return token
+
+def _read_token(path):
+    '''
+    :param path string: token file, see token_path
+    :return string: token
+    :raise OSError: if the file can't be read
+    '''
+    with open(path, "r") as f:
+        return f.read().strip()
+
+def parse_address(address):
+    '''
+    :param address string: Unix socket path or http://host:port
+    :return tuple: ("unix", path) or ("http", (host, port))
+    :raise ValueError: if an http address isn't a loopback address
+    '''
+    if not address.startswith("http://"):
+        return "unix", os.path.abspath(address)
+
+    host, sep, port = address[len("http://"):].rstrip("/").rpartition(":")
+    host = host.strip("[]")
+    if not sep or not port.isdigit():
+        raise ValueError('http address needs a port: ' + address)
+
+    if host not in _loopbackHosts:
+        raise ValueError('server only binds to loopback addresses: ' + address)
+
+    return "http", (host, int(port))
+
+class GenieService:
+    '''
+    GenieService runs generate requests against projects it keeps loaded.
+    '''
+
+    def __init__(self):
+        #config path -> (source stamps, GenProject)
+        self.projects = {}
+        return
+
+    def project(self, configPath, streamConfig=False, snapshot=None):
+        '''
+        :param configPath string: absolute path of a config file or sharded
+            project directory
+        :param streamConfig boolean: stream the config if it has to be loaded
+        :param snapshot string: snapshot file to load the project from
+        :return GenProject: loaded project, reused while its sources are
+            unchanged
+        '''
+        from genie_classes import GenProject
+        from genie_snapshot import open_project, project_sources, source_stamps
+
+        if configPath in self.projects:
+            stamps, project = self.projects[configPath]
+            if source_stamps(stamps) == stamps:
+                return project
+
+        if snapshot:
+            project = open_project(configPath, snapshot)
+        else:
+            project = GenProject(configPath, streamConfig=streamConfig)
+
+        #stamps are taken after loading so class shards are included
+        self.projects[configPath] = (source_stamps(project_sources(project)), project)
+
+        return project
+
+    def handle(self, request):
+        '''
+        :param request dict: generate request, see the module documentation
+        :return dict: response, see the module documentation
+        '''
+        import contextlib
+        import io
+        from genie_profile import Profiler
+        from genie_writers import write_project
+
+        response = {"ok" : False, "output" : "", "classes" : [], "profile" : None, "error" : None}
+        output = io.StringIO()
+        profiler = Profiler()
+        cwd = os.getcwd()
+
+        #relative paths in the config (template-location, project-directory)
+        #are relative to where the client ran
+        try:
+            os.chdir(request.get("cwd") or cwd)
+            with contextlib.redirect_stdout(output):
+                configPath = os.path.abspath(request["config"])
+                project = self.project(configPath, request.get("stream-config", False),
+                                       request.get("snapshot"))
+                print (project.project_name)
+                if request.get("validate"):
+                    from genie_validation import check_project
+                    check_project(project)
+                sink = None
+                if request.get("archive"):
+                    from genie_output import ArchiveSink
+                    sink = ArchiveSink(request["archive"], fsync=request.get("fsync", False))
+                response["ok"] = write_project(project, jobs=request.get("jobs", 1),
+                                               force=request.get("force", False),
+                                               stream=request.get("stream", False),
+                                               profiler=profiler,
+                                               classNames=request.get("only"),
+                                               withDependents=request.get("with-dependents", False),
+                                               writers=request.get("writers", 0),
+                                               fsync=request.get("fsync", False),
+                                               output=sink)
+        except Exception as e:
+            #a failed request must not take the server down. The project is
+            #reloaded next time in case it was left half loaded
+            self.projects.pop(os.path.abspath(request.get("config") or ""), None)
+            response["error"] = '{0}: {1}'.format(type(e).__name__, e)
+        finally:
+            os.chdir(cwd)
+
+        response["output"] = output.getvalue()
+        response["classes"] = profiler.records
+        if request.get("profile"):
+            response["profile"] = profiler.report()
+
+        return response
+
+    def handle_json(self, data):
+        '''
+        :param data bytes: json encoded request
+        :return bytes: json encoded response
+        '''
+        try:
+            request = json.loads(data.decode("utf-8"))
+            if not isinstance(request, dict) or "config" not in request:
+                raise ValueError('request must be an object with a "config" path')
+        except ValueError as e:
+            response = {"ok" : False, "output" : "", "classes" : [], "profile" : None,
+                        "error" : 'bad request: ' + str(e)}
+        else:
+            response = self.handle(request)
+
+        return json.dumps(response).encode("utf-8")
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        data = self.rfile.readline()
+        if data.strip():
+            self.wfile.write(self.server.service.handle_json(data) + b"\n")
+        return
+
+def _host_name(host):
+    '''
+    :param host string: Host header, ie "127.0.0.1:8000" or "[::1]:8000"
+    :return string: host without the port or brackets
+    '''
+    if host.startswith("["):
+        return host[1:].partition("]")[0]
+    return host.partition(":")[0]
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/generate":
+            self.send_error(404)
+            return
+
+        #browsers send an Origin header with cross-origin posts, and can't set
+        #a json Content-Type on one without asking first
+        if self.headers.get("Origin") is not None:
+            self.send_error(403, "cross-origin requests are not allowed")
+            return
+
+        if _host_name(self.headers.get("Host") or "") not in _loopbackHosts:
+            self.send_error(403, "Host must be a loopback address")
+            return
+
+        expected = ("Bearer " + self.server.token).encode("utf-8")
+        if not hmac.compare_digest((self.headers.get("Authorization") or "").encode("utf-8"), expected):
+            self.send_error(401, "missing or wrong token")
+            return
+
+        contentType = (self.headers.get("Content-Type") or "").partition(";")[0].strip().lower()
+        if contentType != "application/json":
+            self.send_error(415, "Content-Type must be application/json")
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.server.service.handle_json(self.rfile.read(length))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return
+
+    def log_message(self, format, *args):
+        #requests are reported by the client, keep the server quiet
+        return
+
+class _HTTPServer(HTTPServer):
+    def __init__(self, address, handler):
+        import socket
+
+        if ":" in address[0]:
+            self.address_family = socket.AF_INET6
+        HTTPServer.__init__(self, address, handler)
+        return
+
+def _socket_in_use(path):
+    '''
+    :return boolean: true if a server is accepting connections on path
+    '''
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        return False
+    finally:
+        client.close()
+
+    return True
+
+def make_server(address=defaultAddress, service=None, tokenFile=None):
+    '''
+    :param address string: Unix socket path or http://host:port. Port 0 picks
+        a free port, see server_address of the returned server.
+    :param service GenieService: service handling the requests
+    :param tokenFile string: file the http token is written to. Defaults to
+        token_path of the port.
+    :return socketserver.BaseServer: server ready for serve_forever. Its
+        files list holds the socket or token file to remove once it's closed.
+    :raise OSError: if another server is already using the Unix socket
+    '''
+    kind, target = parse_address(address)
+
+    if kind == "unix":
+        if os.path.exists(target):
+            if _socket_in_use(target):
+                raise OSError('a server is already running on ' + target)
+            os.unlink(target)
+
+        #the socket is created with the umask, so it's never open to others
+        oldMask = os.umask(0o177)
+        try:
+            server = socketserver.UnixStreamServer(target, _SocketHandler)
+        finally:
+            os.umask(oldMask)
+        server.files = [target]
+    else:
+        server = _HTTPServer(target, _HTTPHandler)
+        tokenFile = tokenFile or token_path(server.server_address[1])
+        try:
+            server.token = _write_token(tokenFile)
+        except OSError:
+            server.server_close()
+            raise
+        server.files = [tokenFile]
+
+    server.service = service or GenieService()
+
+    return server
+
+def serve(address=defaultAddress, service=None, tokenFile=None):
+    '''
+    Serves generate requests until interrupted.
+
+    :param address string: Unix socket path or http://host:port
+    :param service GenieService: service handling the requests
+    :param tokenFile string: file the http token is written to, see make_server
+    :raise OSError: if another server is already using the Unix socket
+    '''
+    server = make_server(address, service, tokenFile)
+
+    print ("Serving on " + address)
+    if hasattr(server, "token"):
+        print ("Token in " + server.files[0])
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        for path in server.files:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    return
+
+def send_request(address, request, timeout=None, tokenFile=None):
+    '''
+    :param address string: Unix socket path or http://host:port
+    :param request dict: generate request, see the module documentation
+    :param timeout float: seconds to wait for the response, None to wait
+        until the run is done
+    :param tokenFile string: file holding the token of an http server.
+        Defaults to token_path of the port.
+    :return dict: server response
+    :raise OSError: if no server answers at address, or its token can't be read
+    '''
+    data = json.dumps(request).encode("utf-8")
+    kind, target = parse_address(address)
+
+    if kind == "http":
+        import urllib.request
+
+        token = _read_token(tokenFile or token_path(target[1]))
+        url = "http://{0}:{1}/generate".format(
+            "[" + target[0] + "]" if ":" in target[0] else target[0], target[1])
+        httpRequest = urllib.request.Request(url, data, {"Content-Type" : "application/json",
+                                                         "Authorization" : "Bearer " + token})
+        with urllib.request.urlopen(httpRequest, timeout=timeout) as reply:
+            return json.loads(reply.read().decode("utf-8"))
+
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(timeout)
+        client.connect(target)
+        client.sendall(data + b"\n")
+        client.shutdown(socket.SHUT_WR)
+
+        chunks = []
+        while True:
+            chunk = client.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        client.close()
+
+    if not chunks:
+        raise OSError('no response from ' + address)
+
+    return json.loads(b"".join(chunks).decode("utf-8"))
@@ -0,0 +1,232 @@
+'''
+:module genie_snapshot:
+Binary snapshots of a project for fast startup.
+
+compile_snapshot stores a GenProject with every class loaded, plus the text of
+its templates and license files and its parsed grammar files, in one marshal
+file. load_snapshot memory maps the file and rebuilds the project and the
+template cache from it without touching any json. Each source file's mtime and
+size is recorded in the snapshot, and the snapshot is ignored as soon as any of
+them changed, so edits to the config or templates are never missed.
+
+Snapshot layout:
+8 bytes     magic, b"GENIESNP"
+4 bytes     snapshot format version, little endian
+4 bytes     marshal version, little endian
+rest        marshal data
+
+marshal data is specific to the python version, which is checked as well.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import gc
+import marshal
+import os
+import struct
+import sys
+
+snapshotMagic = b"GENIESNP"
+snapshotVersion = 1
+
+_header = struct.Struct("<8sII")
+
+def _plain(value):
+    '''
+    :return object: value with dict subclasses (TrackedDict) turned into dicts,
+        which is what marshal can store
+    '''
+    if isinstance(value, dict):
+        return {key : _plain(child) for key, child in value.items()}
+
+    if isinstance(value, list):
+        return [_plain(child) for child in value]
+
+    return value
+
+def _stamp(path):
+    '''
+    :return list: [mtime_ns, size] of path, or None if it doesn't exist
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _config_sources(configPath):
+    '''
+    :param configPath string: config file or sharded project directory
+    :return list: absolute paths the project is loaded from
+    '''
+    configPath = os.path.abspath(configPath)
+    if not os.path.isdir(configPath):
+        return [configPath]
+
+    #the directory mtime changes when shards are added or removed
+    sources = [configPath]
+    for fileName in sorted(os.listdir(configPath)):
+        if fileName.endswith(".json"):
+            sources.append(os.path.join(configPath, fileName))
+
+    return sources
+
+def project_sources(project):
+    '''
+    :param project GenProject: project loaded from a config, project.config set
+    :return list: absolute paths of the config files and class shards the
+        project is loaded from
+    '''
+    from genie_config import projectShardFile, resolve_class_shards
+
+    sources = _config_sources(project.config)
+    shardBase = project.config
+    if os.path.isdir(shardBase):
+        shardBase = os.path.join(shardBase, projectShardFile)
+    sources.extend(resolve_class_shards(shardBase, project.data_dictionary.get("class-shards")).values())
+
+    return sources
+
+def source_stamps(sources):
+    '''
+    :param sources iterable: file paths
+    :return dict: path -> [mtime_ns, size], None for missing files
+    '''
+    return {source : _stamp(source) for source in sources}
+
+def compile_snapshot(project, path):
+    '''
+    :param project GenProject: project loaded from a config, project.config set
+    :param path string: snapshot file to write
+    :return dict: snapshot contents
+    '''
+    from genie_templates import templateCache
+    from genie_writers import class_inputs
+    from genie_output import atomic_write
+
+    classes = project.gen_class
+
+    sources = project_sources(project)
+
+    texts = {}
+    grammars = {}
+    for gClass in classes:
+        inputs = class_inputs(project, gClass)
+        for key in ("definition-template", "implementation-template", "base-definition-template",
+                    "base-implementation-template", "class-license"):
+            if inputs[key] and inputs[key] not in texts:
+                texts[inputs[key]] = templateCache.text(inputs[key])
+
+        if inputs["grammar-file"] and inputs["grammar-file"] not in grammars:
+            grammars[inputs["grammar-file"]] = templateCache.grammar(inputs["grammar-file"])
+
+    sources.extend(texts)
+    sources.extend(grammars)
+
+    snapshot = {
+        "python" : list(sys.version_info[:2]),
+        "config" : os.path.abspath(project.config),
+        "project" : _plain(project.data_dictionary),
+        "sources" : source_stamps(sources),
+        "texts" : texts,
+        "grammars" : _plain(grammars)
+    }
+
+    data = _header.pack(snapshotMagic, snapshotVersion, marshal.version) + marshal.dumps(snapshot)
+    atomic_write(os.path.abspath(path), data)
+
+    return snapshot
+
+def read_snapshot(path):
+    '''
+    :param path string: snapshot file
+    :return dict: snapshot contents, or None if the file is missing, from
+        another version, or any of its source files changed since
+    '''
+    import mmap
+
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if len(mapped) < _header.size:
+            return None
+
+        magic, version, marshalVersion = _header.unpack_from(mapped)
+        if magic != snapshotMagic or version != snapshotVersion or marshalVersion != marshal.version:
+            return None
+
+        #the snapshot is one big acyclic tree, pausing the garbage collector
+        #while it is built roughly triples the load speed
+        gcEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            with memoryview(mapped) as view:
+                snapshot = marshal.loads(view[_header.size:])
+        finally:
+            if gcEnabled:
+                gc.enable()
+    except (EOFError, ValueError, TypeError):
+        return None
+    finally:
+        mapped.close()
+
+    if snapshot.get("python") != list(sys.version_info[:2]):
+        return None
+
+    if source_stamps(snapshot["sources"]) != snapshot["sources"]:
+        return None
+
+    return snapshot
+
+def load_snapshot(path):
+    '''
+    :param path string: snapshot file
+    :return GenProject: project from the snapshot with the template cache
+        primed, or None if the snapshot can't be used
+    '''
+    from genie_classes import GenProject, TrackedDict
+    from genie_templates import templateCache
+
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        return None
+
+    project = GenProject()
+    project.data_dictionary = snapshot["project"]
+    project.data_dictionary["classes"] = TrackedDict(project.data_dictionary["classes"])
+    project.config = snapshot["config"]
+
+    stamps = snapshot["sources"]
+    for source, text in snapshot["texts"].items():
+        templateCache.prime("text", source, tuple(stamps[source]), text)
+
+    for source, grammar in snapshot["grammars"].items():
+        templateCache.prime("grammar", source, tuple(stamps[source]), grammar)
+
+    return project
+
+def open_project(configPath, snapshotPath):
+    '''
+    Loads a project from its snapshot when the snapshot is up to date.
+    Otherwise the project is loaded from its json sources and the snapshot is
+    rewritten for the next run.
+
+    :param configPath string: config file or sharded project directory
+    :param snapshotPath string: snapshot file
+    :return GenProject: loaded project
+    '''
+    from genie_classes import GenProject
+
+    project = load_snapshot(snapshotPath)
+    if project is not None and project.config == os.path.abspath(configPath):
+        return project
+
+    project = GenProject(configPath)
+    compile_snapshot(project, snapshotPath)
+
+    return project
@@ -0,0 +1,626 @@
+'''
+:module genie_templates:
+Compiled tag substitution for the template and grammar files.
+
+Expanding a template is done in two levels. The grammar file maps template
+tags to code syntax that still has tags in it, then the class tags are replaced
+with the real values of a GenClass.
+
+template text       ->          grammar text
+<system-includes>               #include <<system-includes>>
+
+grammar text        ->          end result
+#include <<system-includes>>    #include <string>
+                                #include <iostream>
+
+Both levels are done with one compiled matcher that rewrites every tag in a
+single scan of the template instead of one str.replace pass per tag.
+
+The first level is the same for every class using a template and grammar, so
+CompiledTemplate applies it once and splits the result into literal text and
+slots for the class tags. Rendering a class then only fills in the slots.
+Compiling also finds tags the grammar doesn't define, which would otherwise be
+left in the output as <tag> text, and grammar tags the template never uses.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import os
+import re
+
+nl = "\n"
+
+#tags filled in from the class data. Scalar tags are replaced in place, list
+#tags repeat the line they are on once per item in the list.
+#Custom code of the special member functions is a list of lines.
+customCodeFunctions = ("default-constructor", "default-destructor", "copy-constructor",
+                       "assignment-operator", "equals-operator", "not-equals-operator",
+                       "output-operator", "input-operator")
+#<base_class.name> is only filled in when rendering the base class templates.
+scalarClassTags = ("<class.name>", "<CLASS.NAME>", "<namespace>", "<license>",
+                   "<member-variables.default-value>", "<base_class.name>")
+listClassTags = ("<system-includes>", "<base-class-includes>", "<project-includes>",
+                 "<member-variables>", "<base-classes.definition>",
+                 "<base-classes.implementation>") + tuple("<" + function + ".custom-code>" for function in customCodeFunctions)
+
+#class tags that are usually the same for every class in a project. They are
+#folded into the literal text of a template once, see CompiledTemplate.bind
+invariantClassTags = ("<license>", "<namespace>")
+
+def _alternation(keys):
+    return "|".join(re.escape(key) for key in keys)
+
+_scalarClassPattern = re.compile(_alternation(scalarClassTags))
+_classTagPattern = re.compile(
+    r"^(?P<pre>[^\n]*?)(?P<list>" + _alternation(listClassTags) + r")(?P<post>[^\n]*)$"
+    + "|(?P<tag>" + _alternation(scalarClassTags) + ")",
+    re.MULTILINE)
+
+def _overlaps(key, text):
+    '''
+    Checks if an occurrence of key could share characters with text once text
+    is spliced into a larger string.
+
+    :param key string: tag being searched for
+    :param text string: replacement text, or another tag
+    :return boolean: true if key could be found across or inside text
+    '''
+    if not text:
+        #removing text can join its neighbours into a new key
+        return True
+
+    if key in text or text in key:
+        return True
+
+    for i in range(1, len(key)):
+        if text.endswith(key[:i]) or text.startswith(key[i:]):
+            return True
+
+    return False
+
+class TagMatcher:
+    '''
+    TagMatcher replaces an ordered set of tags with their values. The output is
+    the same as calling str.replace for each tag in order, but tags that can't
+    interact with each other are grouped into one compiled regex so the text
+    is only scanned once per group. With grammar files like templates/grammar.json
+    every tag ends up in a single group.
+
+    Values that are lists are treated as lines of code and joined with newlines.
+    '''
+
+    def __init__(self, pairs):
+        '''
+        :param pairs iterable: (tag, value) tuples in replacement order
+        '''
+        self.stages = []
+
+        keys = []
+        values = {}
+        for key, value in pairs:
+            if isinstance(value, list):
+                value = nl.join(value)
+
+            if not key or key == value:
+                #replacing a tag with itself is a no-op
+                continue
+
+            if self._conflicts(key, keys, values):
+                self.stages.append(self._compile_stage(keys, values))
+                keys = []
+                values = {}
+            elif key in values:
+                #every occurrence was already replaced earlier in this stage
+                continue
+
+            keys.append(key)
+            values[key] = value
+
+        if keys:
+            self.stages.append(self._compile_stage(keys, values))
+
+        return
+
+    @staticmethod
+    def _conflicts(key, keys, values):
+        '''
+        A key has to start a new stage if it could be created by an earlier
+        replacement, or if it could start before and overlap an earlier key.
+        '''
+        for earlier in keys:
+            if _overlaps(key, values[earlier]):
+                return True
+
+            if earlier in key and not key.startswith(earlier):
+                return True
+
+            for i in range(1, len(key)):
+                if earlier.startswith(key[i:]):
+                    return True
+
+        return False
+
+    @staticmethod
+    def _compile_stage(keys, values):
+        '''
+        :return tuple: (single key or None, compiled pattern, tag -> value dict)
+        '''
+        single = keys[0] if len(keys) == 1 else None
+        return (single, re.compile(_alternation(keys)), values)
+
+    def sub(self, text):
+        '''
+        :param text string: text to replace tags in
+        :return string: text with all tags replaced
+        '''
+        for single, pattern, values in self.stages:
+            if single is not None:
+                text = text.replace(single, values[single])
+            else:
+                text = pattern.sub(lambda match: values[match.group(0)], text)
+
+        return text
+
+    def subn(self, text):
+        '''
+        :param text string: text to replace tags in
+        :return tuple: (text with all tags replaced, number of replacements)
+        '''
+        count = 0
+        for single, pattern, values in self.stages:
+            text, n = pattern.subn(lambda match: values[match.group(0)], text)
+            count += n
+
+        return text, count
+
+def compile_grammar(grammar, sections=("shared", "definition")):
+    '''
+    :param grammar dict: parsed grammar file
+    :param sections tuple: grammar sections to use, in replacement order
+    :return TagMatcher: matcher for the grammar tags
+    '''
+    pairs = []
+    for section in sections:
+        pairs.extend(grammar.get(section, {}).items())
+
+    return TagMatcher(pairs)
+
+def expand_class_tags(text, tags):
+    '''
+    Replaces the class tags (<class.name>, <system-includes>, ...) in grammar
+    expanded text with real values.
+
+    :param text string: template text after the grammar has been applied
+    :param tags dict: class tag -> string, or list of strings for list tags
+    :return string: text with the class tags replaced
+    '''
+    def scalar(match):
+        return tags.get(match.group(0), match.group(0))
+
+    def replace(match):
+        tag = match.group("tag")
+        if tag:
+            return tags.get(tag, tag)
+
+        items = tags.get(match.group("list"))
+        if items is None:
+            return _scalarClassPattern.sub(scalar, match.group(0))
+
+        pre = _scalarClassPattern.sub(scalar, match.group("pre"))
+        post = _scalarClassPattern.sub(scalar, match.group("post"))
+        return nl.join(pre + item + post for item in items)
+
+    return _classTagPattern.sub(replace, text)
+
+#anything shaped like a tag that is left after the grammar is applied, and
+#whether it's the target of an #include
+_tagShape = re.compile(r"(#\s*include\s*)?(<[A-Za-z][\w.\-]*>)")
+
+def unknown_tags(text, grammar=None):
+    '''
+    Only names the grammar could have been meant to define are reported: keys
+    of any grammar section, and hyphenated or dotted names like the class tags.
+    Plain names, like the <int> of std::vector<int>, and #include targets are
+    taken to be C++.
+
+    :param text string: template with the grammar applied
+    :param grammar dict: parsed grammar file
+    :return list: sorted tags left in text that look like grammar or class tags
+    '''
+    classTags = set(scalarClassTags) | set(listClassTags)
+    grammarKeys = set()
+    for section in (grammar or {}).values():
+        if isinstance(section, dict):
+            grammarKeys.update(section)
+
+    unknown = set()
+    for include, tag in _tagShape.findall(text):
+        if include or tag in classTags:
+            continue
+        if tag in grammarKeys or "-" in tag or "." in tag:
+            unknown.add(tag)
+
+    return sorted(unknown)
+
+#CompiledTemplate part kinds
+_literal = 0
+_scalar = 1
+_listLine = 2
+
+def _scalar_parts(text):
+    '''
+    :param text string: part of one line
+    :return tuple: literal strings and (tag,) tuples for the scalar tags in it
+    '''
+    parts = []
+    pos = 0
+    for match in _scalarClassPattern.finditer(text):
+        if match.start() > pos:
+            parts.append(text[pos:match.start()])
+        parts.append((match.group(0),))
+        pos = match.end()
+
+    if pos < len(text):
+        parts.append(text[pos:])
+
+    return tuple(parts)
+
+def _fill(parts, tags):
+    return "".join(part if isinstance(part, str) else tags.get(part[0], part[0]) for part in parts)
+
+def _bind_parts(parts, values):
+    '''
+    :param parts tuple: see _scalar_parts
+    :param values dict: scalar class tag -> value
+    :return tuple: parts with the tags in values turned into literal strings
+    '''
+    bound = []
+    for part in parts:
+        if not isinstance(part, str):
+            if part[0] not in values:
+                bound.append(part)
+                continue
+            part = values[part[0]]
+        if bound and isinstance(bound[-1], str):
+            bound[-1] += part
+        elif part:
+            bound.append(part)
+
+    return tuple(bound)
+
+def _frozen(value):
+    return tuple(value) if isinstance(value, list) else value
+
+class CompiledTemplate:
+    '''
+    CompiledTemplate is a template with its grammar already applied, split into
+    literal text and slots for the class tags. render gives the same result as
+    expand_class_tags(grammar.sub(template), tags) but only fills in the slots.
+
+    Each part is a (kind, value, pre, post) tuple:
+    _literal    value is text
+    _scalar     value is a scalar class tag
+    _listLine   value is a list class tag, pre and post are the rest of its
+                line. The line is repeated once per item in the list.
+
+    Tags with the same value for many classes can be folded into the literal
+    text with bind, so rendering each class only fills in what differs.
+    '''
+
+    def __init__(self, template, grammar, grammarDict=None):
+        '''
+        :param template string: definition/implementation template
+        :param grammar TagMatcher: compiled grammar
+        :param grammarDict dict: parsed grammar the matcher was compiled from.
+            Its keys are reported in unknownTags when left in the output, see
+            unknown_tags.
+        '''
+        text, self.grammarCount = grammar.subn(template)
+        self.parts = []
+        #replacements rendering makes, the same for every class
+        self.slotCount = 0
+
+        pos = 0
+        literal = []
+        for match in _classTagPattern.finditer(text):
+            literal.append(text[pos:match.start()])
+            pos = match.end()
+            if "".join(literal):
+                self.parts.append((_literal, "".join(literal), None, None))
+            literal = []
+
+            self.slotCount += 1
+            if match.group("tag"):
+                self.parts.append((_scalar, match.group("tag"), None, None))
+            else:
+                self.parts.append((_listLine, match.group("list"),
+                                   _scalar_parts(match.group("pre")), _scalar_parts(match.group("post"))))
+
+        if pos < len(text):
+            self.parts.append((_literal, text[pos:], None, None))
+
+        self.unknownTags = unknown_tags(text, grammarDict)
+        #set by TemplateCache.template, which has the grammar dictionary
+        self.unusedTags = []
+        #set once the tags above have been reported, so a long running
+        #generator only warns again when the template or grammar changes
+        self.reported = False
+        self._index()
+
+        return
+
+    def _index(self):
+        '''
+        Works out the class tags the parts use and resets the caches.
+        '''
+        tags = []
+        for kind, value, pre, post in self.parts:
+            if kind == _literal:
+                continue
+            for tag in [value] + [part[0] for part in (pre or ()) + (post or ()) if not isinstance(part, str)]:
+                if tag not in tags:
+                    tags.append(tag)
+
+        #class tags left to fill in, in the order they are first used
+        self.tags = tuple(tags)
+        #bound copies and memoized output, see bind and render_memo
+        self.bound = {}
+        self.outputs = {}
+        return
+
+    def bind(self, values):
+        '''
+        :param values dict: scalar class tag -> value, ie the tags in
+            invariantClassTags. Tags the template doesn't use are ignored.
+        :return CompiledTemplate: copy of the template with those tags turned
+            into literal text. Copies are kept, so classes with the same values
+            share one.
+        '''
+        key = tuple(sorted((tag, value) for tag, value in values.items() if tag in self.tags))
+        if not key:
+            return self
+
+        bound = self.bound.get(key)
+        if bound is not None:
+            return bound
+
+        values = dict(key)
+        parts = []
+        for kind, value, pre, post in self.parts:
+            if kind == _scalar and value in values:
+                kind, value = _literal, values[value]
+            elif kind == _listLine:
+                pre = _bind_parts(pre, values)
+                post = _bind_parts(post, values)
+
+            if kind == _literal and parts and parts[-1][0] == _literal:
+                parts[-1] = (_literal, parts[-1][1] + value, None, None)
+            elif kind != _literal or value:
+                parts.append((kind, value, pre, post))
+
+        bound = CompiledTemplate.__new__(CompiledTemplate)
+        bound.parts = parts
+        bound.grammarCount = self.grammarCount
+        bound.slotCount = self.slotCount
+        bound.unknownTags = self.unknownTags
+        bound.unusedTags = self.unusedTags
+        bound.reported = self.reported
+        bound._index()
+        self.bound[key] = bound
+
+        return bound
+
+    @property
+    def tagCount(self):
+        '''
+        :return int: grammar and class tag replacements made for each class
+        '''
+        return self.grammarCount + self.slotCount
+
+    def iter_render(self, tags):
+        '''
+        :param tags dict: class tag values, see expand_class_tags
+        :return iterator: string chunks of the rendered file. A list tag gives
+            a chunk per item with the newlines between them as separate chunks,
+            so a very long list is never joined into one string.
+        '''
+        for kind, value, pre, post in self.parts:
+            if kind == _literal:
+                yield value
+            elif kind == _scalar:
+                yield tags.get(value, value)
+            else:
+                preText = _fill(pre, tags)
+                postText = _fill(post, tags)
+                items = tags.get(value)
+                if items is None:
+                    yield preText + value + postText
+                    continue
+                first = True
+                for item in items:
+                    if not first:
+                        yield nl
+                    first = False
+                    yield preText + item + postText
+
+        return
+
+    def render(self, tags):
+        '''
+        :param tags dict: class tag values, see expand_class_tags
+        :return string: rendered file
+        '''
+        if not self.tags:
+            return self.parts[0][1] if self.parts else ""
+        return "".join(self.iter_render(tags))
+
+    def render_memo(self, tags):
+        '''
+        Renders like render, but keeps the output for each set of tag values,
+        so snippets that come out the same for many classes, like the base
+        class templates, are only rendered once.
+
+        :param tags dict: class tag values, see expand_class_tags
+        :return string: rendered text
+        '''
+        key = tuple(_frozen(tags.get(tag)) for tag in self.tags)
+        text = self.outputs.get(key)
+        if text is None:
+            text = self.outputs[key] = self.render(tags)
+        return text
+
+def unused_grammar_tags(template, grammar, sections=("shared", "definition")):
+    '''
+    :param template string: definition/implementation template
+    :param grammar dict: parsed grammar file
+    :param sections tuple: grammar sections in use
+    :return list: grammar tags that neither the template nor another grammar
+        value in the sections contains. Tags in the "shared" section are meant
+        for both the definition and implementation templates, so they aren't
+        reported.
+    '''
+    pairs = []
+    for section in sections:
+        pairs.extend(grammar.get(section, {}).items())
+
+    shared = grammar.get("shared", {})
+    unused = []
+    for key, value in pairs:
+        if key in template or key in unused or key in shared:
+            continue
+
+        if not any(key in (nl.join(other) if isinstance(other, list) else other)
+                   for otherKey, other in pairs if otherKey != key):
+            unused.append(key)
+
+    return sorted(unused)
+
+class TemplateCache:
+    '''
+    TemplateCache keeps the parsed form of template, grammar and license files
+    so each file is only read once per run. Entries are keyed by absolute path
+    and checked against the file's mtime and size on every lookup, so a long
+    running generator picks up edits to the files.
+    '''
+
+    def __init__(self):
+        self.entries = {}
+        return
+
+    @staticmethod
+    def _stamp(path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _lookup(self, key, path, load):
+        '''
+        :param key tuple: cache key
+        :param path string: file the value comes from, or a tuple of files
+        :param load callable: builds the value when it isn't cached
+        '''
+        if isinstance(path, tuple):
+            stamp = tuple(self._stamp(eachPath) for eachPath in path)
+        else:
+            stamp = self._stamp(path)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        value = load()
+        self.entries[key] = (stamp, value)
+        return value
+
+    def text(self, path):
+        '''
+        :param path string: template or license file
+        :return string: file contents
+        '''
+        path = os.path.abspath(path)
+
+        def load():
+            with open(path, "r") as f:
+                return f.read()
+
+        return self._lookup(("text", path), path, load)
+
+    def grammar(self, path):
+        '''
+        :param path string: grammar json file
+        :return dict: parsed grammar. Shared between callers, don't modify it.
+        '''
+        import json
+        path = os.path.abspath(path)
+
+        def load():
+            with open(path, "r") as f:
+                return json.load(f)
+
+        return self._lookup(("grammar", path), path, load)
+
+    def digest(self, path):
+        '''
+        :param path string: any input file
+        :return string: sha1 hex digest of the file contents
+        '''
+        import hashlib
+        path = os.path.abspath(path)
+
+        def load():
+            with open(path, "rb") as f:
+                return hashlib.sha1(f.read()).hexdigest()
+
+        return self._lookup(("digest", path), path, load)
+
+    def matcher(self, path, sections=("shared", "definition")):
+        '''
+        :param path string: grammar json file
+        :param sections tuple: grammar sections to use, in replacement order
+        :return TagMatcher: compiled grammar
+        '''
+        path = os.path.abspath(path)
+        sections = tuple(sections)
+
+        return self._lookup(("matcher", path, sections), path,
+                            lambda: compile_grammar(self.grammar(path), sections))
+
+    def template(self, templatePath, grammarPath, sections=("shared", "definition")):
+        '''
+        :param templatePath string: template file
+        :param grammarPath string: grammar json file
+        :param sections tuple: grammar sections to use, in replacement order
+        :return CompiledTemplate: template with the grammar applied. Its
+            unusedTags are set too, see unused_grammar_tags.
+        '''
+        templatePath = os.path.abspath(templatePath)
+        grammarPath = os.path.abspath(grammarPath)
+        sections = tuple(sections)
+
+        def load():
+            text = self.text(templatePath)
+            grammar = self.grammar(grammarPath)
+            compiled = CompiledTemplate(text, self.matcher(grammarPath, sections), grammar)
+            compiled.unusedTags = unused_grammar_tags(text, grammar, sections)
+            return compiled
+
+        return self._lookup(("template", templatePath, grammarPath, sections),
+                            (templatePath, grammarPath), load)
+
+    def prime(self, kind, path, stamp, value):
+        '''
+        Adds an already loaded file, ie from a project snapshot. The entry is
+        still checked against the file on every lookup.
+
+        :param kind string: "text" or "grammar"
+        :param path string: absolute path of the file
+        :param stamp tuple: (mtime_ns, size) of the file when it was loaded
+        :param value object: file contents, parsed for grammar files
+        '''
+        self.entries[(kind, path)] = (stamp, value)
+        return
+
+    def clear(self):
+        self.entries.clear()
+        return
+
+#cache shared by the writers
+templateCache = TemplateCache()
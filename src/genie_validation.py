@@ -0,0 +1,165 @@
+'''
+:module genie_validation:
+Checks the names in a project before they end up in generated code. Class,
+member variable, function and parameter names have to be legal C++
+identifiers: letters, digits and underscores, not starting with a digit, not a
+C++ keyword and not one of the identifiers reserved for the compiler (anything
+with a double underscore or starting with an underscore and a capital letter).
+The project name becomes a directory name, so it only can't be empty or hold
+whitespace.
+
+validate_project walks the whole project in one pass and returns every
+problem, check_project raises them all in one ValidationError.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import re
+
+_whitespace = re.compile(r"\s")
+_identifier = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+_reserved = re.compile(r"_[A-Z]|.*__")
+
+#C++20 keywords and alternative operator tokens
+cppKeywords = frozenset((
+    "alignas", "alignof", "and", "and_eq", "asm", "auto", "bitand", "bitor",
+    "bool", "break", "case", "catch", "char", "char8_t", "char16_t", "char32_t",
+    "class", "compl", "concept", "const", "consteval", "constexpr", "constinit",
+    "const_cast", "continue", "co_await", "co_return", "co_yield", "decltype",
+    "default", "delete", "do", "double", "dynamic_cast", "else", "enum",
+    "explicit", "export", "extern", "false", "float", "for", "friend", "goto",
+    "if", "inline", "int", "long", "mutable", "namespace", "new", "noexcept",
+    "not", "not_eq", "nullptr", "operator", "or", "or_eq", "private",
+    "protected", "public", "register", "reinterpret_cast", "requires", "return",
+    "short", "signed", "sizeof", "static", "static_assert", "static_cast",
+    "struct", "switch", "template", "this", "thread_local", "throw", "true",
+    "try", "typedef", "typeid", "typename", "union", "unsigned", "using",
+    "virtual", "void", "volatile", "wchar_t", "while", "xor", "xor_eq"
+))
+
+class ValidationError(ValueError):
+    '''
+    Raised with every problem found in a project at once.
+
+    :param violations list: (where, name, problem) tuples
+    '''
+
+    def __init__(self, violations):
+        self.violations = violations
+        lines = [str(len(violations)) + " invalid names:"]
+        for where, name, problem in violations:
+            lines.append("  {0} {1!r}: {2}".format(where, name, problem))
+        ValueError.__init__(self, "\n".join(lines))
+        return
+
+def contains_whitespace(val):
+    '''
+    :param val string: name
+    :return boolean: true if val has any whitespace in it
+    '''
+    return _whitespace.search(val) is not None
+
+def check_name(val):
+    '''
+    :param val string: project name
+    :return string: what is wrong with the name, None if it's fine
+    '''
+    if not isinstance(val, str) or not val:
+        return "name cannot be empty."
+
+    if _whitespace.search(val):
+        return "name cannot contain whitespace."
+
+    return None
+
+def check_identifier(val):
+    '''
+    :param val string: class, member variable, function or parameter name
+    :return string: what is wrong with the name, None if it's a legal C++
+        identifier
+    '''
+    if not isinstance(val, str) or not val:
+        return "name cannot be empty."
+
+    if _identifier.match(val) is None:
+        if _whitespace.search(val):
+            return "name cannot contain whitespace."
+        return "name must be letters, digits and underscores, not starting with a digit."
+
+    if val in cppKeywords:
+        return "name is a C++ keyword."
+
+    if _reserved.match(val):
+        return "names with __ or starting with _ and a capital letter are reserved."
+
+    return None
+
+def check_names(names, check=check_identifier):
+    '''
+    Checks many names in one pass. Each distinct name is only checked once,
+    names like "param1" repeat a lot across a project.
+
+    :param names iterable: (where, name) tuples, where says what the name
+        belongs to and is handed back in the violations
+    :param check callable: check_identifier or check_name
+    :return list: (where, name, problem) tuples for the invalid names
+    '''
+    checked = {}
+    violations = []
+    for where, name in names:
+        key = name if isinstance(name, str) else None
+        if key in checked:
+            problem = checked[key]
+        else:
+            problem = checked[key] = check(name)
+
+        if problem is not None:
+            violations.append((where, name, problem))
+
+    return violations
+
+def class_identifiers(classDict):
+    '''
+    :param classDict dict: class data dictionary
+    :return iterator: (where, name) for the class name and the names of its
+        member variables, functions and parameters
+    '''
+    className = classDict.get("name")
+    where = "class " + str(className)
+    yield where, className
+
+    for key, member in (classDict.get("member-variables") or {}).items():
+        yield where + " member variable " + key, member.get("name")
+
+    for key, function in (classDict.get("functions") or {}).items():
+        functionWhere = where + " function " + key
+        yield functionWhere, function.get("name")
+        for paramKey, param in (function.get("parameters") or {}).items():
+            yield functionWhere + " parameter " + paramKey, param.get("name")
+
+    return
+
+def validate_project(project):
+    '''
+    :param project GenProject: project data. Every class is loaded.
+    :return list: (where, name, problem) tuples for every invalid name
+    '''
+    violations = check_names([("project", project.project_name)], check_name)
+
+    def identifiers():
+        for gClass in project.gen_class:
+            for item in class_identifiers(gClass.data_dictionary):
+                yield item
+
+    violations.extend(check_names(identifiers()))
+    return violations
+
+def check_project(project):
+    '''
+    :param project GenProject: project data
+    :raise ValidationError: listing every invalid name in the project
+    '''
+    violations = validate_project(project)
+    if violations:
+        raise ValidationError(violations)
+    return
@@ -0,0 +1,384 @@
+'''
+:module genie_watch:
+Watch mode. class_genie.py --watch generates the project once, then keeps it
+loaded and watches the config, the class shards and every template, grammar
+and license file the classes use. Changes are collected until the files have
+been quiet for a short debounce interval and then handled as one batch:
+
+config or shard change      the project is reloaded and only classes whose
+                            entry changed are regenerated. A change to the
+                            project settings regenerates every class.
+template/grammar/license    only the classes using the file are regenerated
+
+Files are watched with inotify on Linux. Anywhere else, or when inotify isn't
+available, they are polled instead.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import json
+import os
+import struct
+import time
+
+#seconds the inputs have to be quiet before a batch is generated
+defaultDebounce = 0.2
+
+#seconds between checks of the polling watcher
+defaultPollInterval = 0.5
+
+class PollWatcher:
+    '''
+    PollWatcher checks the mtime and size of the watched files.
+    '''
+
+    def __init__(self, paths, interval=defaultPollInterval):
+        '''
+        :param paths iterable: absolute file or directory paths
+        :param interval float: seconds between checks
+        '''
+        self.interval = interval
+        self.stamps = {}
+        self.update(paths)
+        return
+
+    def update(self, paths):
+        '''
+        :param paths iterable: absolute paths to watch from now on
+        '''
+        from genie_snapshot import source_stamps
+
+        #files already watched keep their stamp so a change isn't missed
+        stamps = source_stamps(path for path in paths if path not in self.stamps)
+        for path in paths:
+            if path in self.stamps:
+                stamps[path] = self.stamps[path]
+        self.stamps = stamps
+        return
+
+    def wait(self, timeout=None):
+        '''
+        :param timeout float: seconds to wait for a change, None to wait until
+            there is one
+        :return set: paths that changed, empty if the timeout ran out
+        '''
+        from genie_snapshot import source_stamps
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stamps = source_stamps(self.stamps)
+            changed = set(path for path, stamp in stamps.items() if stamp != self.stamps[path])
+            self.stamps = stamps
+            if changed:
+                return changed
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return changed
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def close(self):
+        return
+
+#inotify event masks, see inotify(7)
+_inCloseWrite = 0x8
+_inMovedFrom = 0x40
+_inMovedTo = 0x80
+_inCreate = 0x100
+_inDelete = 0x200
+_inWatchMask = _inCloseWrite | _inMovedFrom | _inMovedTo | _inCreate | _inDelete
+_inNonBlock = 0o4000
+_inCloexec = 0o2000000
+
+_inotifyEvent = struct.Struct("iIII")
+
+class InotifyWatcher:
+    '''
+    InotifyWatcher gets file events from the kernel. Directories holding the
+    watched files are watched rather than the files themselves, so files
+    editors replace by renaming a new copy over them keep being seen.
+    '''
+
+    def __init__(self, paths):
+        '''
+        :param paths iterable: absolute file or directory paths
+        :raise OSError: if inotify isn't available
+        '''
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            self._addWatch = libc.inotify_add_watch
+            fd = libc.inotify_init1(_inNonBlock | _inCloexec)
+        except (OSError, AttributeError) as e:
+            raise OSError('inotify is not available: ' + str(e))
+
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        self._addWatch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self.fd = fd
+        #watch descriptor -> directory
+        self.directories = {}
+        self.watchedDirs = set()
+        self.paths = set()
+        self.wholeDirs = set()
+        self.update(paths)
+        return
+
+    def update(self, paths):
+        '''
+        :param paths iterable: absolute paths to watch from now on
+        '''
+        self.paths = set(paths)
+        self.wholeDirs = set(path for path in self.paths if os.path.isdir(path))
+
+        for path in self.paths:
+            directory = path if path in self.wholeDirs else os.path.dirname(path)
+            if directory in self.watchedDirs or not os.path.isdir(directory):
+                continue
+
+            wd = self._addWatch(self.fd, os.fsencode(directory), _inWatchMask)
+            if wd >= 0:
+                self.directories[wd] = directory
+                self.watchedDirs.add(directory)
+
+        return
+
+    def _read(self):
+        '''
+        :return set: watched paths in the events waiting on the inotify fd
+        '''
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return changed
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _inotifyEvent.unpack_from(data, offset)
+                offset += _inotifyEvent.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+
+                directory = self.directories.get(wd)
+                if directory is None or not name:
+                    continue
+
+                path = os.path.join(directory, name)
+                if path in self.paths or directory in self.wholeDirs:
+                    changed.add(path)
+
+    def wait(self, timeout=None):
+        '''
+        :param timeout float: seconds to wait for a change, None to wait until
+            there is one
+        :return set: paths that changed, empty if the timeout ran out
+        '''
+        import select
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            changed = self._read() if ready else set()
+            if changed or not ready:
+                return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        return
+
+def make_watcher(paths, poll=False):
+    '''
+    :param paths iterable: absolute file or directory paths
+    :param poll boolean: poll even if inotify is available
+    :return object: InotifyWatcher, or PollWatcher as the fallback
+    '''
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except OSError:
+            pass
+
+    return PollWatcher(paths)
+
+def _class_text(gClass):
+    return json.dumps(gClass.data_dictionary, sort_keys=True)
+
+def _settings_text(project):
+    settings = dict(project.data_dictionary)
+    settings.pop("classes", None)
+    return json.dumps(settings, sort_keys=True)
+
+class ProjectWatch:
+    '''
+    ProjectWatch holds the loaded project between batches and works out which
+    classes a batch of changed files affects.
+    '''
+
+    def __init__(self, configPath, streamConfig=False):
+        '''
+        :param configPath string: config file or sharded project directory
+        :param streamConfig boolean: stream the config when loading it
+        '''
+        self.configPath = os.path.abspath(configPath)
+        self.streamConfig = streamConfig
+        self.project = None
+        #class name -> class entry as json, to spot changed classes
+        self.classTexts = {}
+        self.settingsText = None
+        #input file -> names of the classes using it
+        self.users = {}
+        self.sources = set()
+        self.load()
+        return
+
+    def load(self):
+        '''
+        (Re)loads the project.
+
+        :return list: names of the classes that changed since the last load,
+            None if the project settings changed
+        '''
+        from genie_classes import GenProject
+        from genie_snapshot import project_sources
+        from genie_writers import class_inputs
+
+        project = GenProject(self.configPath, streamConfig=self.streamConfig)
+        classes = project.gen_class
+
+        classTexts = {gClass.name : _class_text(gClass) for gClass in classes}
+        settingsText = _settings_text(project)
+
+        if settingsText != self.settingsText:
+            changed = None
+        else:
+            changed = [name for name, text in classTexts.items() if self.classTexts.get(name) != text]
+
+        users = {}
+        for gClass in classes:
+            for path in class_inputs(project, gClass).values():
+                if path:
+                    users.setdefault(path, []).append(gClass.name)
+
+        self.project = project
+        self.classTexts = classTexts
+        self.settingsText = settingsText
+        self.users = users
+        self.sources = set(project_sources(project))
+        return changed
+
+    def paths(self):
+        '''
+        :return set: every file the project is generated from
+        '''
+        return self.sources | set(self.users)
+
+    def affected(self, changed):
+        '''
+        :param changed set: paths that changed
+        :return list: names of the classes to regenerate in project order, None
+            for every class
+        '''
+        configChanged = False
+        for path in changed:
+            if path in self.sources or os.path.dirname(path) == self.configPath:
+                configChanged = True
+
+        names = set()
+        if configChanged:
+            reloaded = self.load()
+            if reloaded is None:
+                return None
+            names.update(reloaded)
+
+        for path in changed:
+            names.update(self.users.get(path, ()))
+
+        return [name for name in self.classTexts if name in names]
+
+def watch_project(configPath, jobs=1, stream=False, streamConfig=False, profiler=None,
+                  debounce=defaultDebounce, poll=False, validate=False, force=False,
+                  writers=0, fsync=False):
+    '''
+    Generates the project, then regenerates it as its inputs change until
+    interrupted. Errors while loading or generating, like a config saved half
+    way through an edit, are printed and the watch carries on.
+
+    :param configPath string: config file or sharded project directory
+    :param jobs int: number of worker processes, see write_project
+    :param stream boolean: write files in chunks, see write_project
+    :param streamConfig boolean: stream the config when loading it
+    :param profiler Profiler: gets a timing record for every class written
+    :param debounce float: seconds the inputs have to be quiet before a batch
+        of changes is generated
+    :param poll boolean: poll the files even if inotify is available
+    :param validate boolean: check the names in the project before each
+        generation, see genie_validation. Nothing is generated while a name is
+        invalid.
+    :param force boolean: write the classes of every batch, even ones the
+        project manifest says are unchanged
+    :param writers int: number of threads writing files, see write_project
+    :param fsync boolean: flush each batch's files to disk, see write_project
+    :raise ValidationError: if validate is set and the project has invalid
+        names when the watch starts
+    '''
+    from genie_validation import check_project, ValidationError
+    from genie_writers import write_project
+
+    state = ProjectWatch(configPath, streamConfig)
+    print (state.project.project_name)
+    if validate:
+        check_project(state.project)
+    options = {"jobs" : jobs, "force" : force, "stream" : stream, "profiler" : profiler,
+               "writers" : writers, "fsync" : fsync}
+    write_project(state.project, **options)
+
+    watcher = make_watcher(state.paths(), poll)
+    print ("Watching " + str(len(state.paths())) + " files with " + type(watcher).__name__)
+    #classes of a batch that failed validation, generated with the next batch.
+    #None for every class
+    carried = []
+    try:
+        while True:
+            changed = watcher.wait()
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changed |= more
+
+            try:
+                classNames = state.affected(changed)
+                if classNames is None or carried is None:
+                    classNames = None
+                elif carried:
+                    names = set(classNames) | set(carried)
+                    classNames = [name for name in state.classTexts if name in names]
+
+                if classNames is None or classNames:
+                    if validate:
+                        try:
+                            check_project(state.project)
+                        except ValidationError:
+                            carried = classNames
+                            raise
+                    write_project(state.project, classNames=classNames, **options)
+                carried = []
+            except Exception as e:
+                print ('Error: {0}: {1}'.format(type(e).__name__, e))
+
+            watcher.update(state.paths())
+    finally:
+        watcher.close()
+
+    return
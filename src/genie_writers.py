@@ -1,6 +1,8 @@
 '''
 
 '''
+from genie_templates import customCodeFunctions, invariantClassTags
+
 templateTags = {
     'class.name' : '<class.name>',
     'CLASS.NAME' : '<CLASS.NAME>',
@@ -15,83 +17,696 @@ templateTags = {
     'member.variable.type' : '<member_variable.type>'
 }
 
-def write_project(project):
+nl = "\n"
+
+#output file extensions for each project language
+languageExtensions = {
+    "c++" : {"definition" : ".h", "implementation" : ".cpp"},
+    "java" : {"definition" : ".java", "implementation" : ".java"}
+}
+
+#output file -> template it's rendered from and the grammar sections used, in
+#the order a class's files are written
+classFiles = (
+    ("definition", "definition-template", ("shared", "definition")),
+    ("implementation", "implementation-template", ("shared", "implmentation"))
+)
+
+def write_project(project, jobs=1, force=False, stream=False, profiler=None, classNames=None,
+                  withDependents=False, writers=0, fsync=False, output=None):
     '''
+    Classes are written in dependency order, base classes and dependencies
+    before the classes that use them (see genie_graph). A streamed config is
+    written in file order instead, so writing can start before it's parsed.
+
     :param project GenieProject: set of classes and build files being written to file.
+    :param jobs int: number of worker processes writing classes. 0 or None
+        uses one per cpu. Classes are reported in the same order either way.
+    :param force boolean: write every class, even ones the project manifest
+        says are unchanged since the last run.
+    :param stream boolean: render and write each file in chunks instead of as
+        one string. Keeps memory down for very large classes.
+    :param profiler Profiler: gets a timing record for every class written
+    :param classNames list: only write these classes. Other classes aren't
+        read, so a sharded project only loads the shards of these classes.
+    :param withDependents boolean: also write every class that depends on a
+        class in classNames, directly or through other classes. These classes
+        are written even if the manifest says they're unchanged.
+    :param writers int: number of threads writing files while classes are
+        rendered, see genie_output.ThreadedSink. 0 writes each file as soon as
+        it's rendered. Only used when jobs is 1, worker processes write their
+        own files.
+    :param fsync boolean: flush the written files to disk once at the end
+    :param output OutputSink: target for the generated files, ie a MemorySink
+        ArchiveSink or DiffSink from genie_output. Defaults to files in the
+        project directory. Targets that don't write to the project directory get every
+        class and leave the project manifest alone. Their file names are
+        relative to the project directory unless their root is already set.
     :return boolean: true if everything was created correctly, false otherwise.
+    :raise ValueError: if a name in classNames isn't in the project, or the
+        classes have a dependency cycle
     '''
     import os
     from genie_classes import GenProject, GenClass
-    import json
+    from genie_graph import class_graph, topological_waves, with_dependents
+    from genie_manifest import Manifest, manifest_path, class_digest
+    from genie_output import OutputSink, ThreadedSink
+    from genie_templates import templateCache
     
     projectDir = os.path.join(os.path.abspath(project.project_directory), project.project_name)
     
-    if (not os.path.isdir(projectDir)):
-        os.makedirs(projectDir)
+    if not jobs or jobs < 1:
+        jobs = os.cpu_count() or 1
+    
+    #only classes whose inputs changed since the last run get written. Classes
+    #are pulled one at a time so a streamed config is generated as it's parsed
+    manifest = Manifest(manifest_path(project))
+    names = []
+    forced = set()
+    
+    def selected():
+        if classNames is None and project.streaming():
+            for gClass in project.iter_gen_class():
+                yield gClass
+            return
+
+        if classNames is not None:
+            for name in classNames:
+                project.find_gen_class(name)
+                if name not in project.data_dictionary["classes"]:
+                    raise ValueError('class ' + name + ' is not in project ' + project.project_name)
+
+            if not withDependents:
+                for name in classNames:
+                    yield project.find_gen_class(name)
+                return
+
+        #waves of classes that only depend on classes in earlier waves. Workers
+        #take jobs in order, so a wave is started before the next one
+        graph = class_graph(project)
+        wanted = None if classNames is None else with_dependents(graph, classNames)
+        if wanted is not None:
+            #a dependent's own inputs are unchanged, so the manifest would skip it
+            forced.update(wanted)
+        for wave in topological_waves(graph):
+            for name in wave:
+                if wanted is None or name in wanted:
+                    yield project.find_gen_class(name)
+    
+    #template problems are reported once for each template and grammar pair,
+    #and not again by later runs in the same process until the files change
+    checked = set()
+    
+    def check_template(gClass):
+        inputs = class_inputs(project, gClass)
+        for outFile, templateFile, sections in class_files(project, gClass, inputs):
+            key = (templateFile, inputs["grammar-file"], sections)
+            if key in checked:
+                continue
+            checked.add(key)
+            
+            compiled = templateCache.template(*key)
+            if compiled.reported:
+                continue
+            compiled.reported = True
+            where = os.path.basename(key[0]) + " with " + os.path.basename(key[1])
+            if compiled.unknownTags:
+                print ("Warning: " + where + ": tags the grammar doesn't define are left in the output: " +
+                       ", ".join(compiled.unknownTags))
+            if compiled.unusedTags:
+                print ("Warning: " + where + ": grammar tags the template doesn't use: " +
+                       ", ".join(compiled.unusedTags))
+        return
+    
+    def pending():
+        for gClass in selected():
+            names.append(gClass.name)
+            #the manifest isn't used by targets that don't write files
+            digest = class_digest(project, gClass) if sink.writesFiles else None
+            outputs = class_outputs(project, gClass)
+            if force or gClass.name in forced or not manifest.is_current(gClass.name, digest, outputs):
+                check_template(gClass)
+                yield (gClass, digest, outputs)
+    
+    retVal = True
+    written = 0
+    done = []
+    completed = False
+    if output is not None:
+        sink = output
+        if sink.root is None:
+            sink.root = os.path.abspath(project.project_directory)
+        force = force or not sink.writesFiles
+    elif writers and jobs == 1:
+        sink = ThreadedSink(writers, fsync=fsync)
+    else:
+        sink = OutputSink(fsync)
+    try:
+        #every output directory is created up front, except for a streamed
+        #config where classes are written before the rest is read
+        entries = pending()
+        outputDirs = set([projectDir])
+        if not project.streaming():
+            entries = list(entries)
+            for entry in entries:
+                outputDirs.update(os.path.dirname(path) for path in entry[2].values())
+        sink.make_dirs(outputDirs)
         
-    for gClass in project.gen_class:
-        #parsedJson = json.loads(gClass)
-        print ("Working on class: " + gClass.class_name)
-        write_class(project, gClass)
+        for (gClass, digest, outputs), result in _write_classes(project, entries, jobs, sink, stream, profiler, fsync):
+            print ("Working on class: " + gClass.name)
+            written += 1
+            if result:
+                done.append((gClass.name, digest, outputs))
+            retVal = retVal and result
+        
+        if classNames is None:
+            manifest.prune(names)
+        completed = True
+    finally:
+        #classes are only recorded once their files are really written
+        try:
+            if completed:
+                sink.close()
+            else:
+                sink.abort()
+        finally:
+            if sink.writesFiles:
+                for name, digest, outputs in done:
+                    if not sink.failed(outputs.values()):
+                        manifest.record(name, digest, outputs)
+                manifest.save()
     
-    return True
+    skipped = len(names) - written
+    if skipped:
+        print ("Skipped " + str(skipped) + " unchanged classes")
+    print (sink.summary())
+    
+    return retVal
 
-def write_class(project, gClass):
+def _write_classes(project, entries, jobs, sink, stream=False, profiler=None, fsync=False):
     '''
-    :param gClass GenClass: metadata class being written to file.
-    :return boolean: true if everything was created correctly, false otherwise.
+    :param project GenProject: project data
+    :param entries iterable: tuples starting with the GenClass to write. Any
+        other items are handed back with the result.
+    :param jobs int: number of worker processes
+    :param sink OutputSink: sink the generated files are written through
+    :param stream boolean: write files in chunks, see write_class
+    :param profiler Profiler: gets a timing record for every class written
+    :param fsync boolean: flush files written by worker processes to disk
+    :return iterator: (entry, write_class result) for each entry, in order
     '''
-    import os
+    if jobs > 1 and not (hasattr(entries, "__len__") and len(entries) < 2):
+        return _write_classes_parallel(project, entries, jobs, sink, stream, profiler, fsync)
+    
+    shared = {}
+    return ((entry, write_class(project, entry[0], sink, stream, profiler, shared)) for entry in entries)
+
+#project, options and shared values used by write_class in worker processes,
+#set by _init_worker
+_workerProject = None
+_workerOptions = {}
+_workerShared = {}
+
+def _init_worker(projectDict, options):
+    global _workerProject, _workerOptions, _workerShared
+    from genie_classes import GenProject
+    
+    _workerProject = GenProject()
+    _workerProject.data_dictionary = projectDict
+    _workerOptions = options
+    _workerShared = {}
+    return
+
+def _write_class_job(classDict):
     from genie_classes import GenClass
+    from genie_output import OutputSink, MemorySink
+    from genie_profile import Profiler
     
-    defFile = ""
-    implFile = ""
-    templatePath = project.template_location
-    print("HERE --> " + templatePath)
-    if (gClass.data_dictionary["definition-template"]):
-        defFile = os.path.join(templatePath, gClass.definition_template)
-        defFile = os.path.abspath(defFile)
-        
-    if gClass.grammar_file:
-        grammarFile = os.path.join(templatePath, gClass.grammar_file)
-        grammarFile = os.path.abspath(grammarFile)
+    gClass = GenClass()
+    gClass.data_dictionary = classDict
+    #files for a target other than the project directory are sent back to be
+    #written by the main process
+    if _workerOptions["collect"]:
+        sink = MemorySink()
+    else:
+        sink = OutputSink(_workerOptions["fsync"])
+        sink.madeDirs = _workerOptions["dirs"]
+    profiler = Profiler() if _workerOptions["profile"] else None
+    result = write_class(_workerProject, gClass, sink, _workerOptions["stream"], profiler, _workerShared)
+    sink.close()
+    records = profiler.records if profiler else []
+    files = sink.files if _workerOptions["collect"] else None
+    return result, sink.counts, sink.bytesWritten, records, files
+
+def _write_class_chunk(classDicts):
+    return [_write_class_job(classDict) for classDict in classDicts]
+
+def _write_classes_parallel(project, entries, jobs, sink, stream=False, profiler=None, fsync=False):
+    '''
+    Writes the classes across a pool of worker processes. Each worker gets the
+    project settings once, then a chunk of class dictionaries per job. At most
+    two jobs per worker are waiting at a time and more entries are only read
+    as jobs finish, so workers start before a streamed config is fully parsed
+    and a large project isn't queued up in memory. Results come back in class
+    order, so the first failing class in the project is the one raised.
     
-    with open(grammarFile, 'r') as grammarFile:
-        grammar = json.load(grammarFile)
+    :param project GenProject: project data
+    :param entries iterable: tuples starting with the GenClass to write
+    :param jobs int: number of worker processes
+    :param sink OutputSink: sink the worker file counts are merged into, or
+        the files themselves for targets other than the project directory
+    :param stream boolean: write files in chunks, see write_class
+    :param profiler Profiler: gets the worker timing records, in class order
+    :param fsync boolean: workers flush the files they wrote to disk
+    :return iterator: (entry, write_class result) for each entry, in order
+    '''
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    from itertools import islice
     
-    #
-    # working on the definition file
-    #
-    print("definition file: " + defFile)
-    with open(defFile ,"r") as f:
-        defTemplate = f.read()
-        
-    #shared find/replace
-    for key, value in grammar["shared"].items():    
-        defTemplate = defTemplate.replace(key, value)
+    #workers don't need every class, only the project level settings
+    projectDict = dict(project.data_dictionary)
+    projectDict["classes"] = {}
+    
+    if hasattr(entries, "__len__"):
+        jobs = min(jobs, len(entries))
+        chunkSize = max(1, len(entries) // (jobs * 4))
+    else:
+        chunkSize = 8
+    
+    #directories the main process already made, so workers don't check them
+    options = {"stream" : stream, "profile" : profiler is not None, "fsync" : fsync,
+               "dirs" : set(sink.madeDirs), "collect" : not sink.writesFiles}
+    
+    entries = iter(entries)
+    #(chunk of entries, future) in submission order
+    window = deque()
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(projectDict, options)) as pool:
+        while True:
+            while len(window) < jobs * 2:
+                chunk = list(islice(entries, chunkSize))
+                if not chunk:
+                    break
+                classDicts = [entry[0].data_dictionary for entry in chunk]
+                window.append((chunk, pool.submit(_write_class_chunk, classDicts)))
+            if not window:
+                break
+            
+            chunk, future = window.popleft()
+            for entry, (result, counts, bytesWritten, records, files) in zip(chunk, future.result()):
+                if files is None:
+                    sink.merge(counts, bytesWritten)
+                else:
+                    for path, text in files.items():
+                        sink.write(path, text)
+                for record in records:
+                    profiler.finish_class(record)
+                yield entry, result
+    
+    return
+
+def class_inputs(project, gClass, resolved=None):
+    '''
+    Resolves the template, grammar and license files used by a class. Project
+    defaults are used for anything the class doesn't set.
+
+    :param project GenProject: project data
+    :param gClass GenClass: class data
+    :param resolved dict: file name -> absolute path of the files already
+        resolved, shared between the classes of a project
+    :return dict: "definition-template", "implementation-template",
+        "base-definition-template", "base-implementation-template",
+        "grammar-file" and "class-license" -> absolute path, or "" if there is
+        no file
+    '''
+    import os
+
+    templatePath = project.template_location
+    files = {
+        "definition-template" : gClass.definition_template or project.default_definition_template,
+        "implementation-template" : gClass.implementation_template or project.default_implementation_template,
+        "base-definition-template" : project.default_base_definition_template,
+        "base-implementation-template" : project.default_base_implementation_template,
+        "grammar-file" : gClass.grammar_file or project.default_grammar_file,
+        "class-license" : gClass.data_dictionary.get("class-license") or project.default_license
+    }
+
+    if resolved is None:
+        resolved = {}
+
+    for key, fileName in files.items():
+        if fileName:
+            if fileName not in resolved:
+                resolved[fileName] = os.path.abspath(os.path.join(templatePath, fileName))
+            files[key] = resolved[fileName]
+
+    return files
+
+def class_outputs(project, gClass):
+    '''
+    :param project GenProject: project data
+    :param gClass GenClass: class data
+    :return dict: "definition" and "implementation" -> absolute path of the
+        generated file. There is no implementation file when the class has no
+        implementation template, or for languages like java where the whole
+        class is in the definition file.
+    '''
+    import os
+
+    extensions = languageExtensions[project.language]
+    parentDir = os.path.join(os.path.abspath(project.project_directory),
+                             project.project_name, gClass.subdirectory)
+    outputs = {
+        "definition" : os.path.abspath(os.path.join(parentDir, gClass.name + extensions["definition"]))
+    }
+
+    implTemplate = gClass.implementation_template or project.default_implementation_template
+    if implTemplate and extensions["implementation"] != extensions["definition"]:
+        outputs["implementation"] = os.path.abspath(os.path.join(parentDir, gClass.name + extensions["implementation"]))
+
+    return outputs
+
+def class_files(project, gClass, inputs=None, outputs=None):
+    '''
+    :param project GenProject: project data
+    :param gClass GenClass: class data
+    :param inputs dict: class_inputs of the class, if already worked out
+    :param outputs dict: class_outputs of the class, if already worked out
+    :return list: (output file, template file, grammar sections) for every
+        file the class is rendered into, see classFiles
+    '''
+    if inputs is None:
+        inputs = class_inputs(project, gClass)
+    if outputs is None:
+        outputs = class_outputs(project, gClass)
 
-    #definition find/replace
-    for key, value in grammar["definition"].items():    
-        defTemplate = defTemplate.replace(key, value)
+    files = []
+    for outputKey, templateKey, sections in classFiles:
+        if outputs.get(outputKey) and inputs[templateKey]:
+            files.append((outputs[outputKey], inputs[templateKey], sections))
+
+    return files
+
+#member variable types whose default values are quoted as string literals
+stringTypes = ("c_string", "std_string", "string")
+
+#config member variable types -> declared type, for each project language.
+#Types that aren't listed are used as they are.
+memberTypes = {
+    "c++" : {"integer" : "int", "c_string" : "char*", "std_string" : "std::string", "string" : "std::string"},
+    "java" : {"integer" : "int", "c_string" : "String", "std_string" : "String", "string" : "String"}
+}
+
+class RenderContext:
+    '''
+    RenderContext holds the class tag values for one class. Each value is
+    worked out the first time a template asks for it and kept for every other
+    template of the class, so the definition, implementation and base class
+    templates share the work. Tags the context doesn't know are left alone.
+
+    It can be handed to CompiledTemplate.render and expand_class_tags in place
+    of a tag dictionary.
+
+    Values that don't depend on the class, like the text of a license file,
+    are kept in a dictionary shared by every class of a run.
+    '''
+    __slots__ = ("project", "gClass", "values", "shared", "_inputs")
+
+    def __init__(self, project, gClass, shared=None):
+        '''
+        :param project GenProject: project data
+        :param gClass GenClass: class data
+        :param shared dict: project level values, shared between the
+            contexts of one run
+        '''
+        self.project = project
+        self.gClass = gClass
+        self.values = {}
+        self.shared = {} if shared is None else shared
+        self._inputs = None
+        return
+
+    @property
+    def inputs(self):
+        '''
+        :return dict: class_inputs of the class
+        '''
+        if self._inputs is None:
+            if "paths" not in self.shared:
+                self.shared["paths"] = {}
+            self._inputs = class_inputs(self.project, self.gClass, self.shared["paths"])
+        return self._inputs
+
+    def get(self, tag, default=None):
+        '''
+        :param tag string: class tag, ie "<class.name>"
+        :param default object: returned for tags the context doesn't know
+        :return object: string, or list of strings for list tags
+        '''
+        if tag in self.values:
+            return self.values[tag]
+
+        builder = self.builders.get(tag)
+        if builder is None:
+            return default
+
+        value = self.values[tag] = builder(self)
+        return value
+
+    def __getitem__(self, tag):
+        if tag not in self.builders:
+            raise KeyError(tag)
+        return self.get(tag)
+
+    def as_dict(self):
+        '''
+        :return dict: every class tag -> value
+        '''
+        return {tag : self.get(tag) for tag in self.builders}
+
+    def bind(self, compiled):
+        '''
+        :param compiled CompiledTemplate: template to render for the class
+        :return CompiledTemplate: compiled with the invariantClassTags of the
+            class already filled in. Classes with the same license and
+            namespace share it.
+        '''
+        return compiled.bind({tag : self.get(tag) for tag in invariantClassTags})
+
+    def _class_name(self):
+        return self.gClass.name
+
+    def _upper_name(self):
+        return self.get("<class.name>").upper()
+
+    def _namespace(self):
+        return self.gClass.namespace or self.project.default_namespace
+
+    def _license(self):
+        from genie_templates import templateCache
+
+        licenseFile = self.inputs["class-license"]
+        if not licenseFile:
+            return ""
+
+        key = ("license", licenseFile)
+        if key not in self.shared:
+            self.shared[key] = templateCache.text(licenseFile).rstrip(nl)
+        return self.shared[key]
+
+    def _system_includes(self):
+        return list(self.gClass.system_includes)
+
+    def _base_class_includes(self):
+        return [base + ".h" for base in self.gClass.base_classes]
+
+    def _project_includes(self):
+        return [depend + ".h" for depend in self.gClass.dependencies]
+
+    def _member_variables(self):
+        '''
+        :return list: one declaration per member variable
+        '''
+        language = self.project.language
+        types = memberTypes.get(language, {})
+
+        declarations = []
+        for member in self.gClass.member_variables_as_dict().values():
+            memberType = types.get(member["type"], member["type"])
+            if language == "java":
+                declarations.append(member.get("scope", "private") + " " + memberType + " " + member["name"] + ";")
+            else:
+                declarations.append(memberType + " " + member["name"] + ";")
+
+        return declarations
+
+    def _initializer_list(self):
+        '''
+        :return string: " : name(value), ..." for the member variables with a
+            default value, "" if none have one
+        '''
+        import json
+
+        initializers = []
+        for member in self.gClass.member_variables_as_dict().values():
+            value = member.get("default-value")
+            if value in (None, ""):
+                continue
+            if member["type"] in stringTypes:
+                value = json.dumps(value)
+            initializers.append(member["name"] + "(" + value + ")")
+
+        if not initializers:
+            return ""
+        return " : " + ", ".join(initializers)
+
+    def _base_overrides(self, templateKey, sections):
+        '''
+        Renders the base class template once for each base class. Overrides
+        that come out the same for every class using a base class are only
+        rendered once, see CompiledTemplate.render_memo. An override whose code
+        matches one rendered for an earlier base class is left out, so a
+        function declared in several bases is only overridden once.
+
+        :param templateKey string: "base-definition-template" or
+            "base-implementation-template"
+        :param sections tuple: grammar sections to use
+        :return list: lines of the rendered templates, a blank line between
+            base classes
+        '''
+        from genie_templates import templateCache
+
+        templateFile = self.inputs[templateKey]
+        if not templateFile or not self.gClass.base_classes:
+            return []
+
+        key = ("template", templateFile, self.inputs["grammar-file"], sections)
+        if key not in self.shared:
+            self.shared[key] = templateCache.template(templateFile, self.inputs["grammar-file"], sections)
+        compiled = self.shared[key]
+
+        values = {tag : self.get(tag) for tag in invariantClassTags}
+        lines = []
+        seen = set()
+        for base in self.gClass.base_classes:
+            values["<base_class.name>"] = base
+            rendered = compiled.bind(values).render_memo(self).splitlines()
+            #bases declaring the same function share one override
+            code = tuple(line.strip() for line in rendered if not _is_comment(line))
+            if code in seen:
+                continue
+            seen.add(code)
+            if lines:
+                lines.append("")
+            lines.extend(rendered)
+
+        return lines
+
+    def _base_definitions(self):
+        return self._base_overrides("base-definition-template", ("shared", "definition"))
+
+    def _base_implementations(self):
+        return self._base_overrides("base-implementation-template", ("shared", "implmentation"))
+
+    #class tag -> function computing its value
+    builders = {
+        "<class.name>" : _class_name,
+        "<CLASS.NAME>" : _upper_name,
+        "<namespace>" : _namespace,
+        "<license>" : _license,
+        "<system-includes>" : _system_includes,
+        "<base-class-includes>" : _base_class_includes,
+        "<project-includes>" : _project_includes,
+        "<member-variables>" : _member_variables,
+        "<member-variables.default-value>" : _initializer_list,
+        "<base-classes.definition>" : _base_definitions,
+        "<base-classes.implementation>" : _base_implementations
+    }
+
+def _is_comment(line):
+    line = line.strip()
+    return line.startswith(("//", "/*", "*"))
+
+def _custom_code(function):
+    def build(context):
+        return list(context.gClass.data_dictionary.get(function, {}).get("custom-code") or [])
+    return build
+
+for _function in customCodeFunctions:
+    RenderContext.builders["<" + _function + ".custom-code>"] = _custom_code(_function)
+
+def class_tags(project, gClass):
+    '''
+    Builds the values for the class tags used by the second level of template
+    expansion. Project defaults are used for anything the class doesn't set.
+
+    :param project GenProject: project data
+    :param gClass GenClass: class data
+    :return dict: class tag -> string, or list of strings for list tags
+    '''
+    return RenderContext(project, gClass).as_dict()
+
+def write_class(project, gClass, sink=None, stream=False, profiler=None, shared=None):
+    '''
+    :param gClass GenClass: metadata class being written to file.
+    :param sink OutputSink: sink the generated files are written through.
+        Files with unchanged contents are left untouched.
+    :param stream boolean: render and write the files in chunks, so the
+        whole file is never held in memory as one string. Substitution time
+        is counted as write time when streaming.
+    :param profiler Profiler: gets a timing record for this class
+    :param shared dict: project level values shared by the classes of a run,
+        see RenderContext
+    :return boolean: true if everything was created correctly, false otherwise.
+    '''
+    import os
+    from genie_classes import GenClass
+    from genie_templates import templateCache
+    from genie_output import OutputSink
+    from genie_profile import timed
     
-    #print the result to file
-    extension = project.language
-    parentDir = project.project_directory
-    defOutFile = os.path.abspath(os.path.join(parentDir, gClass.class_name + extension))
+    if sink is None:
+        sink = OutputSink()
     
-    with open(defOutFile, "w") as f:
-        f.write(classDefinition)
+    record = profiler.start_class(gClass.name) if profiler else None
     
-    #
-    # working on the implementation file
-    #
+    #derived values are shared by every file the class is rendered into, the
+    #definition and implementation are written in one pass over the class
+    context = RenderContext(project, gClass, shared)
+    inputs = context.inputs
+    outputs = class_outputs(project, gClass)
+    
+    for outFile, templateFile, sections in class_files(project, gClass, inputs, outputs):
+        with timed(record, "template"):
+            templateCache.text(templateFile)
+        
+        #the grammar is applied once per template and the license and
+        #namespace once per project, only the class values are filled in here
+        with timed(record, "grammar"):
+            compiled = templateCache.template(templateFile, inputs["grammar-file"], sections)
+            bound = context.bind(compiled)
+        
+        sink.make_dir(os.path.dirname(outFile))
+        
+        if record is not None:
+            record["tags"] += compiled.tagCount
+        
+        if stream:
+            with timed(record, "write"):
+                sink.write_stream(outFile, bound.iter_render(context), record)
+        else:
+            with timed(record, "substitute"):
+                classText = bound.render(context)
+            with timed(record, "write"):
+                sink.write(outFile, classText, record)
     
-    #implementation find/replace
+    if record is not None:
+        profiler.finish_class(record)
     
     return True
 
 
-def replace_tags(project, gClass, template):
+def replace_tags(project, gClass, template, grammar=None, record=None):
     '''
     replaces all tags with grammar file code. Then replace the name tags in the
     grammar code with final values to get complete code.
@@ -110,22 +725,22 @@ def replace_tags(project, gClass, template):
     :param project GenProject: project data
     :param gClass GenClass: class data
     :param template string: definition/implmentation template as a string
+    :param grammar TagMatcher: compiled grammar. Defaults to the shared and
+        definition sections of the class grammar file.
+    :param record dict: profiler record the number of replacements is added to
     :return string: template string, tags replaced with real values
     '''
-    import json
+    from genie_templates import templateCache, CompiledTemplate
     
     #expand the template file to be more like code syntax. This will still have
     # <tags> in it that need to be replaced
-    grammar=""
-    with open('../templates/grammar.json', 'r') as grammarFile:
-        grammar = json.load(grammarFile)
+    if grammar is None:
+        grammar = templateCache.matcher(class_inputs(project, gClass)["grammar-file"])
     
+    compiled = CompiledTemplate(template, grammar)
+    if record is not None:
+        record["tags"] += compiled.tagCount
     
-    for key, value in grammar.items():    
-        template = template.replace(key, value)
-        
-    print (template)
+    template = compiled.render(RenderContext(project, gClass))
     
-    #template = template.replace(templateTags['CLASS.NAME'], gClass.name.upper())
     return template
-
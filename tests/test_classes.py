@@ -0,0 +1,74 @@
+'''
+:module test_classes:
+The cached wrappers of GenClass and GenProject have to follow the data
+dictionaries, including changes made through references taken before the
+wrappers were first read.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from genie_classes import GenClass, GenProject
+
+def member(name):
+    return {"name" : name, "scope" : "private", "type" : "integer",
+            "access-function" : False, "default-value" : "0"}
+
+class WrapperCacheTest(unittest.TestCase):
+
+    def test_member_reference_taken_before_read(self):
+        gClass = GenClass()
+        members = gClass.member_variables_as_dict()
+        self.assertEqual(gClass.member_variables, ())
+
+        members["count"] = member("count")
+        self.assertIs(gClass.member_variables_as_dict(), members)
+        self.assertEqual([view.member_name for view in gClass.member_variables], ["count"])
+
+        del members["count"]
+        self.assertEqual(gClass.member_variables, ())
+        return
+
+    def test_function_reference_taken_before_read(self):
+        gClass = GenClass()
+        functions = gClass.functions_as_dict()
+        gClass.functions
+
+        functions["run"] = {"name" : "run", "scope" : "public", "return-type" : "void",
+                            "parameters" : {}, "custom-code" : []}
+        self.assertEqual(len(gClass.functions), 1)
+        return
+
+    def test_classes_of_assigned_dictionary(self):
+        project = GenProject()
+        project.data_dictionary = dict(project.data_dictionary, classes={})
+        classes = project.data_dictionary["classes"]
+        self.assertEqual(project.gen_class, ())
+
+        newClass = GenClass()
+        newClass.name = "Added"
+        classes["Added"] = newClass.data_dictionary
+        self.assertIs(project.data_dictionary["classes"], classes)
+        self.assertEqual([gClass.name for gClass in project.gen_class], ["Added"])
+        self.assertEqual(project.find_gen_class("Added").name, "Added")
+        return
+
+    def test_wrappers_reused(self):
+        project = GenProject.from_dicts([{"name" : "A"}, {"name" : "B"}])
+        views = project.gen_class
+
+        self.assertIs(project.gen_class, views)
+        self.assertIs(project.find_gen_class("A"), views[0])
+
+        project.add_classes([{"name" : "C"}])
+        self.assertEqual([gClass.name for gClass in project.gen_class], ["A", "B", "C"])
+        self.assertIs(project.gen_class[0], views[0])
+        return
+
+if __name__ == "__main__":
+    unittest.main()
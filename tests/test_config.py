@@ -0,0 +1,71 @@
+'''
+:module test_config:
+ConfigStream has to parse a valid config the same way no matter where the
+read blocks split it.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from genie_config import ConfigStream
+
+def parse(path, blockSize):
+    '''
+    :return dict: the whole config, read through a ConfigStream
+    '''
+    stream = ConfigStream(path)
+    stream.blockSize = blockSize
+    config = stream.settings()
+    config["classes"] = dict(stream.classes())
+    config.update(stream.finish())
+    return config
+
+class ConfigStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-config-")
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def check(self, text, blockSizes=range(1, 12)):
+        path = os.path.join(self.workDir, "config.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+        expected = json.loads(text)
+        for blockSize in blockSizes:
+            self.assertEqual(parse(path, blockSize), expected, "block size " + str(blockSize))
+        return
+
+    def test_numbers_split_across_blocks(self):
+        self.check('{"a": 1e-7, "b": 12.5, "c": -3, "d": 6.02E+23, "classes": {}}')
+        self.check('{"classes": {"A": {"n": 10.25, "m": [1.5e3, -0.0, 7]}}, "z": 2.5}')
+        return
+
+    def test_number_at_block_boundary(self):
+        #"a": 12.5 straddles the end of the first block
+        prefix = '{"pad": "' + "x" * ((1 << 16) - 20) + '", '
+        text = prefix + '"a": 12.5, "classes": {}}'
+        for offset in range(-3, 4):
+            self.check(text, [len(prefix) + 6 + offset])
+        return
+
+    def test_example_config(self):
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "xml", "config.json"), "r") as f:
+            self.check(f.read(), (1, 7, 64, 1 << 16))
+        return
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+'''
+:module test_graph:
+Tests for the class dependency graph in genie_graph and for --only with
+dependents in genie_writers.write_project.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+from genie_classes import GenProject
+from genie_graph import class_graph, find_cycle, topological_waves, with_dependents
+from genie_writers import write_project
+
+#D derives from B and C, which both derive from A. E uses A
+diamond = {"A" : [], "B" : ["A"], "C" : ["A"], "D" : ["B", "C"], "E" : ["A"]}
+
+class GraphTest(unittest.TestCase):
+
+    def test_class_graph(self):
+        project = GenProject.from_dicts([
+            {"name" : "A"},
+            {"name" : "B", "base-classes" : ["A", "A"], "dependencies" : ["std::string", "B"]},
+            {"name" : "C", "dependencies" : ["B"]}])
+
+        self.assertEqual(class_graph(project), {"A" : [], "B" : ["A"], "C" : ["B"]})
+        return
+
+    def test_find_cycle(self):
+        self.assertIsNone(find_cycle(diamond))
+        self.assertIsNone(find_cycle({}))
+
+        cycle = find_cycle({"A" : [], "X" : ["Y"], "Y" : ["Z"], "Z" : ["X"]})
+        self.assertEqual(cycle, ["X", "Y", "Z", "X"])
+
+        cycle = find_cycle({"A" : ["B"], "B" : ["C"], "C" : ["B"]})
+        self.assertEqual(cycle, ["B", "C", "B"])
+        return
+
+    def test_topological_waves(self):
+        self.assertEqual(topological_waves(diamond), [["A"], ["B", "C", "E"], ["D"]])
+        self.assertEqual(topological_waves({"Z" : [], "Y" : []}), [["Z", "Y"]])
+        self.assertEqual(topological_waves({}), [])
+
+        with self.assertRaises(ValueError) as raised:
+            topological_waves({"X" : ["Y"], "Y" : ["X"]})
+        self.assertIn("X -> Y -> X", str(raised.exception))
+        return
+
+    def test_with_dependents(self):
+        self.assertEqual(with_dependents(diamond, ["B"]), {"B", "D"})
+        self.assertEqual(with_dependents(diamond, ["A"]), set(diamond))
+        self.assertEqual(with_dependents(diamond, ["D", "E"]), {"D", "E"})
+        self.assertEqual(with_dependents(diamond, []), set())
+        return
+
+class OnlyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.project = GenProject.from_dicts(
+            [{"name" : name, "base-classes" : bases} for name, bases in diamond.items()],
+            settings={"template-location" : os.path.join(repoDir, "templates")})
+        self.project.project_directory = tempfile.mkdtemp()
+        return
+
+    def written(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            write_project(self.project, **kwargs)
+        prefix = "Working on class: "
+        return [line[len(prefix):] for line in out.getvalue().splitlines() if line.startswith(prefix)]
+
+    def test_dependents_written_after_unchanged_run(self):
+        self.assertEqual(self.written(), ["A", "B", "C", "E", "D"])
+        self.assertEqual(self.written(), [])
+
+        self.assertEqual(self.written(classNames=["B"], withDependents=True), ["B", "D"])
+        self.assertEqual(self.written(classNames=["A"], withDependents=True, jobs=2),
+                         ["A", "B", "C", "E", "D"])
+        self.assertEqual(self.written(classNames=["B"]), [])
+        return
+
+    def test_unknown_class(self):
+        with self.assertRaises(ValueError):
+            self.written(classNames=["Missing"], withDependents=True)
+        return
+
+if __name__ == "__main__":
+    unittest.main()
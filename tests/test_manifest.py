@@ -0,0 +1,117 @@
+'''
+:module test_manifest:
+Incremental runs through the project manifest: only classes whose inputs
+changed since the last run are written again.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+from genie_classes import GenProject
+from genie_manifest import Manifest, manifest_path
+from genie_writers import write_project
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-manifest-")
+        self.templateDir = os.path.join(self.workDir, "templates")
+        shutil.copytree(os.path.join(repoDir, "templates"), self.templateDir)
+        shutil.copy(os.path.join(self.templateDir, "grammar.json"), os.path.join(self.templateDir, "other.json"))
+        shutil.copy(os.path.join(self.templateDir, "definition.template"),
+                    os.path.join(self.templateDir, "other.template"))
+
+        #A and B use the default files, C its own grammar and D its own definition template
+        self.project = GenProject.from_dicts(
+            [{"name" : "A"}, {"name" : "B"}, {"name" : "C", "grammar-file" : "other.json"},
+             {"name" : "D", "definition-template" : "other.template"}],
+            settings={"template-location" : self.templateDir})
+        self.project.project_directory = self.workDir
+        self.outputDir = os.path.join(self.workDir, self.project.project_name)
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def written(self, **kwargs):
+        '''
+        :return list: names of the classes the run wrote
+        '''
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertTrue(write_project(self.project, **kwargs))
+        prefix = "Working on class: "
+        return [line[len(prefix):] for line in out.getvalue().splitlines() if line.startswith(prefix)]
+
+    def edit(self, name, text="\n"):
+        with open(os.path.join(self.templateDir, name), "a") as f:
+            f.write(text)
+        return
+
+    def test_second_run_skips_everything(self):
+        self.assertEqual(self.written(), ["A", "B", "C", "D"])
+        self.assertEqual(self.written(), [])
+        self.assertEqual(self.written(jobs=2), [])
+        self.assertEqual(self.written(force=True), ["A", "B", "C", "D"])
+        return
+
+    def test_template_edit(self):
+        self.written()
+
+        self.edit("other.template")
+        self.assertEqual(self.written(), ["D"])
+
+        self.edit("definition.template")
+        self.assertEqual(self.written(), ["A", "B", "C"])
+        self.assertEqual(self.written(), [])
+        return
+
+    def test_grammar_edit(self):
+        self.written()
+
+        with open(os.path.join(self.templateDir, "other.json"), "r") as f:
+            grammar = json.load(f)
+        grammar["shared"]["<extra>"] = "extra"
+        with open(os.path.join(self.templateDir, "other.json"), "w") as f:
+            json.dump(grammar, f)
+
+        self.assertEqual(self.written(), ["C"])
+        return
+
+    def test_class_edit(self):
+        self.written()
+
+        self.project.find_gen_class("B").namespace = "other"
+        self.assertEqual(self.written(), ["B"])
+        return
+
+    def test_deleted_output(self):
+        self.written()
+
+        os.unlink(os.path.join(self.outputDir, "C.cpp"))
+        self.assertEqual(self.written(), ["C"])
+        self.assertTrue(os.path.isfile(os.path.join(self.outputDir, "C.cpp")))
+        self.assertEqual(self.written(), [])
+        return
+
+    def test_removed_class_pruned(self):
+        self.written()
+        del self.project.data_dictionary["classes"]["D"]
+        self.written()
+
+        self.assertEqual(sorted(Manifest(manifest_path(self.project)).classes), ["A", "B", "C"])
+        return
+
+if __name__ == "__main__":
+    unittest.main()
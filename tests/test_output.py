@@ -0,0 +1,163 @@
+'''
+:module test_output:
+Tests for genie_output.ThreadedSink: errors from the writer threads, the
+bounded queue and keeping files that failed out of the project manifest.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+from genie_classes import GenProject
+from genie_manifest import Manifest, manifest_path
+from genie_output import ThreadedSink, NEW, QUEUED, UNCHANGED
+from genie_writers import write_project
+
+class HeldSink(ThreadedSink):
+    '''
+    HeldSink's writers wait for release before writing each file.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        ThreadedSink.__init__(self, *args, **kwargs)
+        return
+
+    def _write_data(self, path, data, record=None):
+        self.started.set()
+        self.release.wait(30)
+        return ThreadedSink._write_data(self, path, data, record)
+
+class ThreadedSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-output-")
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def path(self, name):
+        return os.path.join(self.workDir, name)
+
+    def test_writes(self):
+        sink = ThreadedSink(4)
+        for index in range(50):
+            self.assertEqual(sink.write(self.path(str(index) + ".h"), str(index)), QUEUED)
+        sink.close()
+
+        self.assertEqual(sink.counts[NEW], 50)
+        with open(self.path("49.h"), "r") as f:
+            self.assertEqual(f.read(), "49")
+
+        sink = ThreadedSink(2)
+        sink.write(self.path("1.h"), "1")
+        sink.close()
+        self.assertEqual(sink.counts[UNCHANGED], 1)
+        return
+
+    def test_failed_writer(self):
+        sink = ThreadedSink(2)
+        badPath = os.path.join(self.workDir, "missing", "Bad.h")
+        sink.write(badPath, "bad")
+        sink.write(self.path("Good.h"), "good")
+
+        with self.assertRaises(OSError):
+            sink.close()
+        self.assertTrue(sink.failed([badPath]))
+        self.assertFalse(sink.failed([self.path("Good.h")]))
+        self.assertTrue(os.path.isfile(self.path("Good.h")))
+
+        #close keeps raising and the sink takes no more files
+        with self.assertRaises(OSError):
+            sink.close()
+        with self.assertRaises(ValueError):
+            sink.write(self.path("Late.h"), "late")
+        return
+
+    def test_error_raised_by_next_write(self):
+        sink = ThreadedSink(1, queueSize=1)
+        sink.write(os.path.join(self.workDir, "missing", "Bad.h"), "bad")
+
+        #the queue only has room for one file, so the writer gets to the bad
+        #one long before this runs out
+        with self.assertRaises(OSError):
+            for index in range(1000):
+                sink.write(self.path(str(index) + ".h"), "x")
+        with self.assertRaises(OSError):
+            sink.close()
+        return
+
+    def test_queue_size_one(self):
+        sink = ThreadedSink(1, queueSize=1)
+        for index in range(20):
+            sink.write(self.path(str(index) + ".h"), str(index))
+        sink.close()
+
+        self.assertEqual(sink.counts[NEW], 20)
+        self.assertEqual(sorted(os.listdir(self.workDir)), sorted(str(index) + ".h" for index in range(20)))
+        return
+
+    def test_write_blocks_when_full(self):
+        sink = HeldSink(1, queueSize=1)
+        #the writer holds the first file, the second fills the queue
+        sink.write(self.path("0.h"), "0")
+        self.assertTrue(sink.started.wait(30))
+        sink.write(self.path("1.h"), "1")
+
+        done = threading.Event()
+        def write():
+            sink.write(self.path("2.h"), "2")
+            done.set()
+        thread = threading.Thread(target=write, daemon=True)
+        thread.start()
+
+        self.assertFalse(done.wait(0.3))
+        sink.release.set()
+        self.assertTrue(done.wait(30))
+        thread.join()
+        sink.close()
+
+        self.assertEqual(sink.counts[NEW], 3)
+        return
+
+class ManifestFailureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-output-")
+        self.project = GenProject.from_dicts([{"name" : "A"}, {"name" : "B"}, {"name" : "C"}],
+                                             settings={"template-location" : os.path.join(repoDir, "templates")})
+        self.project.project_directory = self.workDir
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def test_failed_files_not_recorded(self):
+        #a directory where B.h goes can't be replaced by the file
+        os.makedirs(os.path.join(self.workDir, self.project.project_name, "B.h"))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(OSError):
+                write_project(self.project, writers=2)
+
+        manifest = Manifest(manifest_path(self.project))
+        self.assertNotIn("B", manifest.classes)
+        self.assertIn("A", manifest.classes)
+        return
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+'''
+:module test_server:
+Round trip of a generate request through the Unix socket server, and the
+checks the http server makes before running a request.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+import genie_server
+
+def make_config(workDir, memberName=None):
+    '''
+    :param workDir string: directory the project is generated in
+    :param memberName string: name given to a member variable of ExampleClass
+    :return string: path of a copy of xml/config.json writing to workDir
+    '''
+    with open(os.path.join(repoDir, "xml", "config.json"), "r") as f:
+        config = json.load(f)
+
+    if memberName is not None:
+        config["classes"]["ExampleClass"]["member-variables"]["exampleInt"]["name"] = memberName
+    config["project-directory"] = workDir
+    config["template-location"] = os.path.join(repoDir, "templates")
+
+    configPath = os.path.join(workDir, "config.json")
+    with open(configPath, "w") as f:
+        json.dump(config, f)
+
+    return configPath
+
+class SocketRoundTripTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-server-")
+        self.address = os.path.join(self.workDir, "genie.sock")
+        self.server = genie_server.make_server(self.address)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def test_generate(self):
+        request = {"config" : make_config(self.workDir), "cwd" : self.workDir}
+        response = genie_server.send_request(self.address, request, timeout=60)
+
+        self.assertIsNone(response["error"])
+        self.assertTrue(response["ok"])
+        self.assertIn("TestGenPyProject", response["output"])
+        self.assertEqual([record["class"] for record in response["classes"]], ["ExampleClass"])
+
+        projectDir = os.path.join(self.workDir, "TestGenPyProject")
+        self.assertEqual(sorted(os.listdir(projectDir)), ["ExampleClass.cpp", "ExampleClass.h"])
+
+        #the second request reuses the loaded project and finds nothing to do
+        response = genie_server.send_request(self.address, request, timeout=60)
+        self.assertTrue(response["ok"])
+        self.assertIn("Skipped 1 unchanged classes", response["output"])
+        return
+
+    def test_archive(self):
+        archive = os.path.join(self.workDir, "project.zip")
+        request = {"config" : make_config(self.workDir), "cwd" : self.workDir, "archive" : archive}
+        response = genie_server.send_request(self.address, request, timeout=60)
+
+        self.assertIsNone(response["error"])
+        self.assertTrue(os.path.isfile(archive))
+        return
+
+    def test_validate(self):
+        request = {"config" : make_config(self.workDir, "bad name"), "cwd" : self.workDir,
+                   "validate" : True}
+        response = genie_server.send_request(self.address, request, timeout=60)
+
+        self.assertFalse(response["ok"])
+        self.assertTrue(response["error"].startswith("ValidationError"))
+        self.assertIn("'bad name'", response["error"])
+        self.assertFalse(os.path.exists(os.path.join(self.workDir, "TestGenPyProject")))
+        return
+
+    def test_socket_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.address).st_mode), 0o600)
+        return
+
+    def test_bad_request(self):
+        response = json.loads(self.server.service.handle_json(b"[]").decode("utf-8"))
+
+        self.assertFalse(response["ok"])
+        self.assertTrue(response["error"].startswith("bad request"))
+        return
+
+class HTTPHeaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-server-")
+        self.tokenFile = os.path.join(self.workDir, "token")
+        self.server = genie_server.make_server("http://127.0.0.1:0", tokenFile=self.tokenFile)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def post(self, headers, token=True):
+        '''
+        :param headers dict: request headers, Host is added if not given
+        :param token boolean: send the server's token
+        :return tuple: (status, body)
+        '''
+        import http.client
+
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            connection.putrequest("POST", "/generate", skip_host="Host" in headers)
+            body = b"[]"
+            headers = dict(headers, **{"Content-Length" : str(len(body))})
+            if token:
+                headers.setdefault("Authorization", "Bearer " + self.server.token)
+            for name, value in headers.items():
+                connection.putheader(name, value)
+            connection.endheaders(body)
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def test_json_accepted(self):
+        status, body = self.post({"Content-Type" : "application/json; charset=utf-8"})
+
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body.decode("utf-8"))["error"].startswith("bad request"))
+        return
+
+    def test_send_request(self):
+        address = "http://127.0.0.1:" + str(self.port)
+        response = genie_server.send_request(address, {"config" : "/nonexistent/config.json"}, timeout=30,
+                                             tokenFile=self.tokenFile)
+
+        self.assertFalse(response["ok"])
+        self.assertIsNotNone(response["error"])
+        return
+
+    def test_token_file(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.tokenFile).st_mode), 0o600)
+        with open(self.tokenFile, "r") as f:
+            self.assertEqual(f.read(), self.server.token)
+        return
+
+    def test_token_required(self):
+        headers = {"Content-Type" : "application/json"}
+        self.assertEqual(self.post(headers, token=False)[0], 401)
+        self.assertEqual(self.post(dict(headers, Authorization="Bearer wrong"))[0], 401)
+        self.assertEqual(self.post(dict(headers, Authorization=self.server.token))[0], 401)
+        return
+
+    def test_send_request_without_token(self):
+        address = "http://127.0.0.1:" + str(self.port)
+        with self.assertRaises(OSError):
+            genie_server.send_request(address, {"config" : "/nonexistent/config.json"}, timeout=30,
+                                      tokenFile=os.path.join(self.workDir, "missing"))
+        return
+
+    def test_other_content_type_rejected(self):
+        self.assertEqual(self.post({"Content-Type" : "text/plain"})[0], 415)
+        self.assertEqual(self.post({})[0], 415)
+        return
+
+    def test_origin_rejected(self):
+        headers = {"Content-Type" : "application/json", "Origin" : "http://127.0.0.1:" + str(self.port)}
+        self.assertEqual(self.post(headers)[0], 403)
+        return
+
+    def test_host_rejected(self):
+        headers = {"Content-Type" : "application/json", "Host" : "attacker.example:" + str(self.port)}
+        self.assertEqual(self.post(headers)[0], 403)
+        return
+
+if __name__ == "__main__":
+    unittest.main()
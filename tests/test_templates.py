@@ -0,0 +1,143 @@
+'''
+:module test_templates:
+Differential tests for the compiled substitution in genie_templates. TagMatcher
+has to give the same text as a chain of str.replace calls, and CompiledTemplate
+the same text as expand_class_tags on the grammar expanded template, for any
+template, grammar and tag values.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import os
+import random
+import sys
+import unittest
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+from genie_templates import (TagMatcher, CompiledTemplate, TemplateCache, expand_class_tags,
+                             unknown_tags, scalarClassTags, listClassTags, invariantClassTags)
+
+#pieces random templates and values are made of. Partial tags and brackets
+#make tags that overlap, or that only appear once other tags are replaced
+atoms = list(scalarClassTags) + list(listClassTags) + [
+    "<a>", "<b>", "<ab>", "x", "\n", " ", "<", ">", "<<", ">>", "#include ", "<class", ".name>", "a>"]
+grammarKeys = ["<a>", "<b>", "<ab>", "x", "<class>", "a>", "<<"]
+
+def replace_chain(text, pairs):
+    '''
+    :return string: text after str.replace for each pair in order
+    '''
+    for key, value in pairs:
+        if isinstance(value, list):
+            value = "\n".join(value)
+        text = text.replace(key, value)
+    return text
+
+class DifferentialTest(unittest.TestCase):
+
+    cases = 5000
+
+    def setUp(self):
+        self.random = random.Random(1)
+        return
+
+    def text(self, most):
+        return "".join(self.random.choice(atoms) for _ in range(self.random.randint(0, most)))
+
+    def pairs(self):
+        pairs = []
+        for _ in range(self.random.randint(0, 4)):
+            value = self.text(4)
+            if self.random.random() < 0.2:
+                value = [self.text(3) for _ in range(self.random.randint(0, 3))]
+            pairs.append((self.random.choice(grammarKeys), value))
+        return pairs
+
+    def tags(self):
+        tags = {}
+        for tag in scalarClassTags:
+            if self.random.random() < 0.8:
+                tags[tag] = self.random.choice(["N", "", "<namespace>", "a\nb", "<system-includes>"])
+        for tag in listClassTags:
+            if self.random.random() < 0.8:
+                tags[tag] = self.random.choice([[], ["s"], ["a", "b"], ["<class.name>"]])
+        return tags
+
+    def test_tag_matcher(self):
+        for _ in range(self.cases):
+            text = self.text(25)
+            pairs = self.pairs()
+            matcher = TagMatcher(pairs)
+            expected = replace_chain(text, pairs)
+
+            self.assertEqual(matcher.sub(text), expected, (text, pairs))
+            self.assertEqual(matcher.subn(text)[0], expected, (text, pairs))
+        return
+
+    def test_compiled_template(self):
+        for _ in range(self.cases):
+            template = self.text(25)
+            grammar = TagMatcher(self.pairs())
+            tags = self.tags()
+            expected = expand_class_tags(grammar.sub(template), tags)
+            compiled = CompiledTemplate(template, grammar)
+
+            self.assertEqual(compiled.render(tags), expected, (template, tags))
+            self.assertEqual("".join(compiled.iter_render(tags)), expected, (template, tags))
+
+            bound = compiled.bind({tag : tags[tag] for tag in invariantClassTags if tag in tags})
+            self.assertEqual(bound.render(tags), expected, (template, tags))
+            self.assertEqual(bound.render_memo(tags), expected, (template, tags))
+            self.assertEqual(bound.tagCount, compiled.tagCount)
+        return
+
+    def test_shipped_templates(self):
+        cache = TemplateCache()
+        grammarPath = os.path.join(repoDir, "templates", "grammar.json")
+        tags = {"<class.name>" : "Example", "<CLASS.NAME>" : "EXAMPLE", "<namespace>" : "test",
+                "<license>" : "/* license */", "<system-includes>" : ["string", "vector"],
+                "<base-class-includes>" : ["Base.h"], "<project-includes>" : [],
+                "<member-variables>" : ["int count;"],
+                "<member-variables.default-value>" : " : count(0)",
+                "<base-classes.definition>" : ["virtual void Initialize();"],
+                "<base-classes.implementation>" : []}
+
+        for name in ("definition.template", "impl.template", "baseDefinition.template", "baseImpl.template"):
+            templatePath = os.path.join(repoDir, "templates", name)
+            for sections in (("shared", "definition"), ("shared", "implmentation")):
+                compiled = cache.template(templatePath, grammarPath, sections)
+                expected = expand_class_tags(cache.matcher(grammarPath, sections).sub(cache.text(templatePath)), tags)
+                self.assertEqual(compiled.render(tags), expected, (name, sections))
+        return
+
+    def test_unknown_tags(self):
+        text = ("#include <vector>\n#include <stdint.h>\n#include \"<a-b>.h\"\n"
+                "std::vector<int> values;\nstd::map<std::string, Base::Item> items;\n"
+                "<class.name> <public-functions> <copy-constructor> <header> <ctor> <item.value>")
+        grammar = {"shared" : {"<header>" : "h"}, "implmentation" : {"<ctor>" : "c"}, "version" : 1}
+
+        self.assertEqual(unknown_tags(text), ["<a-b>", "<copy-constructor>", "<item.value>", "<public-functions>"])
+        self.assertEqual(unknown_tags(text, grammar),
+                         ["<a-b>", "<copy-constructor>", "<ctor>", "<header>", "<item.value>", "<public-functions>"])
+
+        compiled = CompiledTemplate(text, TagMatcher([("<header>", "h")]), grammar)
+        self.assertEqual(compiled.unknownTags,
+                         ["<a-b>", "<copy-constructor>", "<ctor>", "<item.value>", "<public-functions>"])
+        return
+
+    def test_list_chunks(self):
+        grammar = TagMatcher([])
+        compiled = CompiledTemplate("start\n    <member-variables>\nend", grammar)
+        members = ["int m" + str(index) + ";" for index in range(1000)]
+        chunks = list(compiled.iter_render({"<member-variables>" : members}))
+
+        self.assertEqual("".join(chunks), "start\n" + "\n".join("    " + member for member in members) + "\nend")
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), len("    int m999;"))
+        self.assertEqual(chunks.count("\n"), 999)
+        self.assertEqual("".join(compiled.iter_render({"<member-variables>" : []})), "start\n\nend")
+        return
+
+if __name__ == "__main__":
+    unittest.main()
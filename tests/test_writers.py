@@ -0,0 +1,120 @@
+'''
+:module test_writers:
+Tests for the files genie_writers renders for a class.
+
+:author: Devin Webb
+:email: devin.a.webb@gmail.com
+'''
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(repoDir, "src"))
+
+from genie_classes import GenProject
+from genie_output import MemorySink
+from genie_writers import write_class, write_project, _write_classes_parallel
+
+def render(classes, name):
+    '''
+    :return dict: file extension -> text of the files rendered for class name
+    '''
+    project = GenProject.from_dicts(classes, settings={"template-location" : os.path.join(repoDir, "templates")})
+    project.project_directory = tempfile.gettempdir()
+    sink = MemorySink()
+    write_class(project, project.find_gen_class(name), sink)
+    return {os.path.splitext(path)[1] : text for path, text in sink.files.items()}
+
+class BaseOverrideTest(unittest.TestCase):
+
+    def test_implementation_stub_is_qualified(self):
+        files = render([{"name" : "Derived", "base-classes" : ["Base"]}], "Derived")
+
+        self.assertIn("void Derived::Initialize(){", files[".cpp"])
+        self.assertNotIn("Base::Initialize(){", files[".cpp"])
+        self.assertNotIn("virtual", files[".cpp"])
+        self.assertIn("virtual void Initialize();", files[".h"])
+        return
+
+    def test_stub_shared_by_bases_rendered_once(self):
+        files = render([{"name" : "Derived", "base-classes" : ["Base", "Other"]}], "Derived")
+
+        self.assertEqual(files[".h"].count("void Initialize();"), 1)
+        self.assertEqual(files[".cpp"].count("void Derived::Initialize(){"), 1)
+        return
+
+    def test_stub_rendered_per_class(self):
+        classes = [{"name" : "First", "base-classes" : ["Base"]}, {"name" : "Second", "base-classes" : ["Base"]}]
+        render(classes, "First")
+
+        self.assertIn("void Second::Initialize(){", render(classes, "Second")[".cpp"])
+        return
+
+    def test_no_bases(self):
+        files = render([{"name" : "Plain"}], "Plain")
+
+        self.assertNotIn("Initialize", files[".h"] + files[".cpp"])
+        return
+
+class TemplateWarningTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix="genie-writers-")
+        self.templateDir = os.path.join(self.workDir, "templates")
+        shutil.copytree(os.path.join(repoDir, "templates"), self.templateDir)
+        self.project = GenProject.from_dicts([{"name" : "Example"}], settings={"template-location" : self.templateDir})
+        self.project.project_directory = self.workDir
+        return
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+        return
+
+    def warnings(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            write_project(self.project, force=True)
+        return [line for line in out.getvalue().splitlines() if line.startswith("Warning: definition.template")]
+
+    def test_reported_once_until_changed(self):
+        first = self.warnings()
+        self.assertTrue(any("<public-functions>" in line for line in first), first)
+        self.assertEqual(self.warnings(), [])
+
+        with open(os.path.join(self.templateDir, "definition.template"), "a") as f:
+            f.write("\n<extra-tag>\nstd::vector<int> values;\n")
+        again = self.warnings()
+        self.assertTrue(any("<extra-tag>" in line for line in again), again)
+        self.assertFalse(any("<int>" in line for line in again), again)
+        return
+
+class ParallelTest(unittest.TestCase):
+
+    def test_entries_read_as_jobs_finish(self):
+        project = GenProject.from_dicts([{"name" : "C" + str(index)} for index in range(100)],
+                                        settings={"template-location" : os.path.join(repoDir, "templates")})
+        project.project_directory = tempfile.gettempdir()
+        read = []
+
+        def entries():
+            for gClass in project.gen_class:
+                read.append(gClass.name)
+                yield (gClass,)
+
+        sink = MemorySink(tempfile.gettempdir())
+        results = _write_classes_parallel(project, entries(), 2, sink)
+        first = next(results)
+
+        #two chunks of 8 classes for each of the 2 workers
+        self.assertLessEqual(len(read), 32)
+        names = [first[0][0].name] + [entry[0].name for entry, result in results]
+        self.assertEqual(names, [gClass.name for gClass in project.gen_class])
+        self.assertEqual(len(sink.files), 200)
+        return
+
+if __name__ == "__main__":
+    unittest.main()